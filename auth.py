@@ -1,20 +1,231 @@
 # auth.py
-from db import get_conn, hash_pwd
+# 口令存储格式：
+#   scrypt$n$r$p$<盐 hex>$<哈希 hex>          （默认，每个用户独立随机盐）
+#   pbkdf2_sha256$<迭代次数>$<盐 hex>$<哈希 hex>（hashlib 不支持 scrypt 时使用）
+#   64 位 hex                                   （旧版 SHA-256 + 固定盐，登录成功后自动升级）
+# KDF 代价参数保存在 app_settings 表的 "kdf" 键中，可用
+#   python auth.py calibrate --target-ms 250
+# 在本机上重新标定；之后登录时，按旧参数计算的哈希也会自动升级。
 
+import os
+import sys
+import csv
+import hmac
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from db import get_conn, hash_pwd, get_setting, set_setting
+
+KDF = "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2_sha256"
+DEFAULT_PARAMS = {
+    "scrypt":        {"n": 2 ** 14, "r": 8, "p": 1},
+    "pbkdf2_sha256": {"iterations": 600_000},
+}
+MAX_COST = {"scrypt": 2 ** 18, "pbkdf2_sha256": 100_000_000}   # 标定上限（scrypt 约 256 MB 内存）
+TARGET_MS = 250
+SALT_BYTES = 16
+
+_params = None
+_DUMMY_SALT = os.urandom(SALT_BYTES)     # 工号不存在时照常计算一次 KDF，耗时与存在时一致
+
+
+def _derive(kdf: str, params: dict, pwd: str, salt: bytes) -> bytes:
+    if kdf == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(pwd.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p + (1 << 20), dklen=32)
+    return hashlib.pbkdf2_hmac("sha256", pwd.encode(), salt, params["iterations"])
+
+
+def _encode(kdf: str, params: dict, salt: bytes, digest: bytes) -> str:
+    if kdf == "scrypt":
+        cost = f"{params['n']}${params['r']}${params['p']}"
+    else:
+        cost = str(params["iterations"])
+    return f"{kdf}${cost}${salt.hex()}${digest.hex()}"
+
+
+def _decode(stored: str):
+    """解析存储的哈希，返回 (kdf, params, salt, digest)；旧版哈希返回 kdf=None"""
+    kdf, _, rest = stored.partition("$")
+    parts = rest.split("$")
+    if kdf == "scrypt" and len(parts) == 5:
+        n, r, p = map(int, parts[:3])
+        return kdf, {"n": n, "r": r, "p": p}, bytes.fromhex(parts[3]), bytes.fromhex(parts[4])
+    if kdf == "pbkdf2_sha256" and len(parts) == 3:
+        return kdf, {"iterations": int(parts[0])}, bytes.fromhex(parts[1]), bytes.fromhex(parts[2])
+    return None, None, None, None
+
+
+def kdf_params(conn=None) -> dict:
+    """当前 KDF 代价参数（从 app_settings 读取并缓存，未标定时使用默认值）"""
+    global _params
+    if _params is None:
+        if conn is None:
+            with get_conn() as c:
+                raw = get_setting(c, "kdf")
+        else:
+            raw = get_setting(conn, "kdf")
+        stored = json.loads(raw) if raw else {}
+        _params = stored.get(KDF, DEFAULT_PARAMS[KDF])
+    return _params
+
+
+def hash_password(pwd: str, params: dict = None) -> str:
+    """生成带随机盐的 KDF 哈希"""
+    params = params or kdf_params()
+    salt = os.urandom(SALT_BYTES)
+    return _encode(KDF, params, salt, _derive(KDF, params, pwd, salt))
+
+
+def check_password(pwd: str, stored: str):
+    """
+    校验口令，返回 (是否正确, 是否需要升级)。stored 为空（工号不存在）时
+    仍按当前参数计算一次，不让响应时间暴露哪些工号存在。
+    旧版哈希或代价参数与当前设置不同的哈希在校验通过后需要升级。
+    """
+    if not stored:
+        _derive(KDF, kdf_params(), pwd, _DUMMY_SALT)
+        return False, False
+    kdf, params, salt, digest = _decode(stored)
+    if kdf is None:
+        return hmac.compare_digest(stored, hash_pwd(pwd)), True
+    if kdf == "scrypt" and not hasattr(hashlib, "scrypt"):
+        return False, False
+    ok = hmac.compare_digest(_derive(kdf, params, pwd, salt), digest)
+    return ok, ok and (kdf != KDF or params != kdf_params())
+
+
+def calibrate(target_ms: float = TARGET_MS) -> dict:
+    """在本机上逐步加倍代价参数，直到单次校验耗时达到 target_ms"""
+    key = "n" if KDF == "scrypt" else "iterations"
+    params = dict(DEFAULT_PARAMS[KDF])
+    params[key] = 2 ** 10 if KDF == "scrypt" else 10_000
+    salt = os.urandom(SALT_BYTES)
+    while params[key] < MAX_COST[KDF]:
+        t0 = time.perf_counter()
+        _derive(KDF, params, "calibrate", salt)
+        if (time.perf_counter() - t0) * 1000 >= target_ms:
+            break
+        params[key] *= 2          # scrypt 的 n 必须是 2 的幂
+    return params
+
+
+def save_params(params: dict, conn=None):
+    """保存 KDF 参数到 app_settings 并更新缓存"""
+    global _params
+    with (conn or get_conn()) as c:
+        raw = get_setting(c, "kdf")
+        stored = json.loads(raw) if raw else {}
+        stored[KDF] = params
+        set_setting(c, "kdf", json.dumps(stored))
+        c.commit()
+    _params = params
+
+
+def ensure_kdf_params(conn=None, target_ms: float = TARGET_MS):
+    """首次运行时在本机标定 KDF 参数并保存；之后只加载已保存的参数"""
+    global _params
+    with (conn or get_conn()) as c:
+        raw = get_setting(c, "kdf")
+        if not raw or KDF not in json.loads(raw):
+            save_params(calibrate(target_ms), c)
+        else:
+            _params = json.loads(raw)[KDF]
+
+
+# —— 数据库操作（接收连接作为第一个参数，写操作不提交） —— #
+def get_password_hash(conn, uid: str):
+    row = conn.execute("SELECT 密码 FROM users WHERE 工号=?", (uid,)).fetchone()
+    return row[0] if row else None
+
+
+def check_user(conn, uid: str, pwd: str):
+    """
+    在给定连接上验证工号/密码，返回 (是否正确, 升级信息)。
+    升级信息为 None 或 (旧哈希, 新哈希)，由调用方用 apply_upgrade 写回。
+    """
+    stored = get_password_hash(conn, uid)
+    ok, upgrade = check_password(pwd, stored)
+    if ok and upgrade:
+        return True, (stored, hash_password(pwd))
+    return ok, None
+
+
+def apply_upgrade(conn, uid: str, old: str, new: str):
+    """只有哈希仍是校验时读到的旧值才写入，避免覆盖期间被修改的新密码"""
+    conn.execute("UPDATE users SET 密码=? WHERE 工号=? AND 密码=?", (new, uid, old))
+
+
+def store_hashes(conn, users):
+    """批量写入 [(工号, 已计算的哈希), ...]"""
+    conn.executemany("""
+        INSERT INTO users(工号, 密码) VALUES(?, ?)
+        ON CONFLICT(工号) DO UPDATE SET 密码=excluded.密码
+    """, users)
+
+
+def hash_users(users, workers: int = None):
+    """并行计算 [(工号, 密码), ...] 的哈希（hashlib 的 KDF 计算期间释放 GIL）"""
+    users = list(users)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        hashes = list(pool.map(hash_password, (pwd for _, pwd in users)))
+    return [(uid, h) for (uid, _), h in zip(users, hashes)]
+
+
+# —— 直连模式入口 —— #
 def verify_user(uid: str, pwd: str) -> bool:
-    """验证工号/密码（明文对比哈希）"""
-    h = hash_pwd(pwd)
+    """验证工号/密码；旧版或低代价哈希在验证通过后自动升级"""
     with get_conn() as conn:
-        cur = conn.execute("SELECT 密码 FROM users WHERE 工号=?", (uid,))
-        row = cur.fetchone()
-    return bool(row and row[0] == h)
+        ok, upgrade = check_user(conn, uid, pwd)
+        if upgrade:
+            apply_upgrade(conn, uid, *upgrade)
+            conn.commit()
+    return ok
+
 
 def upsert_user(uid: str, pwd: str):
     """插入或更新用户密码"""
-    h = hash_pwd(pwd)
+    h = hash_password(pwd)
+    with get_conn() as conn:
+        store_hashes(conn, [(uid, h)])
+        conn.commit()
+
+
+def upsert_users(users, workers: int = None):
+    """批量开通/重置用户：先并行计算哈希，再在一个事务中写入"""
+    hashed = hash_users(users, workers)
     with get_conn() as conn:
-        conn.execute("""
-            INSERT INTO users(工号, 密码) VALUES(?, ?)
-            ON CONFLICT(工号) DO UPDATE SET 密码=excluded.密码
-        """, (uid, h))
+        store_hashes(conn, hashed)
         conn.commit()
+    return len(hashed)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="用户口令管理")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    cp = sub.add_parser("calibrate", help="在本机标定 KDF 代价参数")
+    cp.add_argument("--target-ms", type=float, default=TARGET_MS)
+    ip = sub.add_parser("import", help="从 CSV（工号,密码）批量开通用户")
+    ip.add_argument("csv")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "calibrate":
+        params = calibrate(args.target_ms)
+        save_params(params)
+        t0 = time.perf_counter()
+        hash_password("benchmark", params)
+        print(f"{KDF} 参数 {params}，单次校验 {(time.perf_counter() - t0) * 1000:.0f} ms")
+    else:
+        with open(args.csv, encoding="utf-8-sig", newline="") as f:
+            users = [(row[0].strip(), row[1]) for row in csv.reader(f) if len(row) >= 2]
+        if users and users[0][0] == "工号":
+            users = users[1:]
+        print(f"已写入 {upsert_users(users)} 个用户")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
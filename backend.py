@@ -0,0 +1,272 @@
+# backend.py
+# 数据访问后端：直接读写数据库文件（DirectBackend），
+# 或通过 tool_service.py 提供的 HTTP/JSON 服务访问（ServiceBackend）。
+# 两种后端提供同一组操作，界面只依赖 get_backend()。
+
+import os
+import json
+import sqlite3
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+import auth
+import tool_events
+import wear_history
+from db import get_conn, DB_FILE, DDL_MAP, COND_KEYS, ROLLUP_DIMS, data_version
+
+SERVICE_ENV = "TOOLS_SERVICE_URL"
+TOKEN_ENV   = "TOOLS_SERVICE_TOKEN"
+
+
+# —— 刀具表操作（均接收连接作为第一个参数，写操作不提交） —— #
+def _check_table(table: str):
+    if table not in DDL_MAP:
+        raise ValueError(f"未知刀具表：{table}")
+
+def _columns(conn, table: str):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+def list_tools(conn, table: str, text: str = ""):
+    """返回 {"columns": [...], "rows": [[rowid, ...], ...]}，按编号/型号模糊过滤"""
+    _check_table(table)
+    sql = f"SELECT rowid, * FROM {table}"
+    args = ()
+    if text:
+        sql += " WHERE 刀具编号 LIKE ? OR 刀具型号 LIKE ?"
+        args = (f"%{text}%",) * 2
+    return {"columns": _columns(conn, table),
+            "rows": [list(r) for r in conn.execute(sql, args)]}
+
+def insert_tool(conn, table: str, values: dict):
+    """插入一行，返回新行的 rowid"""
+    _check_table(table)
+    cols = [c for c in values if c in _columns(conn, table)]
+    if len(cols) != len(values):
+        raise ValueError(f"{table} 中不存在字段：{set(values) - set(cols)}")
+    cur = conn.execute(
+        f"INSERT INTO {table}({','.join(cols)}) VALUES({','.join('?' * len(cols))})",
+        [values[c] for c in cols])
+    return cur.lastrowid
+
+def update_tool(conn, table: str, rowid: int, column: str, value):
+    _check_table(table)
+    if column not in _columns(conn, table):
+        raise ValueError(f"{table} 中不存在字段：{column}")
+    conn.execute(f"UPDATE {table} SET {column}=? WHERE rowid=?", (value, rowid))
+
+def delete_tool(conn, table: str, rowid: int):
+    _check_table(table)
+    conn.execute(f"DELETE FROM {table} WHERE rowid=?", (rowid,))
+
+def condition_counts(conn, table: str):
+    """统计某类刀具 新/良好/差 的数量（读取库存汇总，每把刀具在每个维度中恰好计一次）"""
+    _check_table(table)
+    counts = dict.fromkeys(COND_KEYS, 0)
+    cur = conn.execute(
+        f"SELECT 状况, SUM(数量) FROM inventory_rollup "
+        f"WHERE 刀具表=? AND 维度='库存状态' AND 状况 IN ({','.join('?' * len(COND_KEYS))}) "
+        f"GROUP BY 状况",
+        (table, *COND_KEYS))
+    counts.update(cur.fetchall())
+    return counts
+
+def inventory_rollup(conn, dimension: str, table: str = None, condition: str = None):
+    """
+    库存汇总：按 dimension 的取值和刀具状况计数，返回 [[取值, 状况, 数量], ...]。
+    table/condition 为空时汇总全部刀具表/全部状况。
+    """
+    if dimension not in ROLLUP_DIMS:
+        raise ValueError(f"未知统计维度：{dimension}")
+    sql = "SELECT 取值, 状况, SUM(数量) FROM inventory_rollup WHERE 维度=?"
+    args = [dimension]
+    if table:
+        _check_table(table)
+        sql += " AND 刀具表=?"
+        args.append(table)
+    if condition:
+        sql += " AND 状况=?"
+        args.append(condition)
+    sql += " GROUP BY 取值, 状况 HAVING SUM(数量) > 0 ORDER BY 取值, 状况"
+    return [list(r) for r in conn.execute(sql, args)]
+
+
+# 口令校验/写入涉及耗时的 KDF，不放入普通读写操作表：
+# 直连模式由 DirectBackend 直接调用 auth，服务模式由 tool_service 单独处理
+READ_OPS = {
+    "list_tools":         list_tools,
+    "condition_counts":   condition_counts,
+    "inventory_rollup":   inventory_rollup,
+    "holdings":           tool_events.query_holdings,
+    "weekly_utilization": tool_events.query_weekly_utilization,
+    "wear_trend":         wear_history.query_trend,
+    "wear_suppliers":     wear_history.suppliers,
+}
+WRITE_OPS = {
+    "insert_tool":  insert_tool,
+    "update_tool":  update_tool,
+    "delete_tool":  delete_tool,
+    "record_event": tool_events.insert_event,
+    "record_wear":  wear_history.insert_points,
+}
+
+
+class Backend:
+    """后端公共接口，子类只需实现 call() 和 data_version()"""
+    remote = False
+
+    def call(self, op: str, **kwargs):
+        raise NotImplementedError
+
+    def data_version(self) -> int:
+        raise NotImplementedError
+
+    def verify_user(self, uid, pwd):
+        return self.call("verify_user", uid=uid, pwd=pwd)
+
+    def upsert_user(self, uid, pwd):
+        return self.call("upsert_user", uid=uid, pwd=pwd)
+
+    def upsert_users(self, users):
+        return self.call("upsert_users", users=[list(u) for u in users])
+
+    def list_tools(self, table, text=""):
+        return self.call("list_tools", table=table, text=text)
+
+    def insert_tool(self, table, values):
+        return self.call("insert_tool", table=table, values=values)
+
+    def update_tool(self, table, rowid, column, value):
+        return self.call("update_tool", table=table, rowid=rowid, column=column, value=value)
+
+    def delete_tool(self, table, rowid):
+        return self.call("delete_tool", table=table, rowid=rowid)
+
+    def condition_counts(self, table):
+        return self.call("condition_counts", table=table)
+
+    def inventory_rollup(self, dimension, table=None, condition=None):
+        return self.call("inventory_rollup", dimension=dimension, table=table, condition=condition)
+
+    def holdings(self, operator=""):
+        return self.call("holdings", operator=operator)
+
+    def weekly_utilization(self, weeks=12):
+        return self.call("weekly_utilization", weeks=weeks)
+
+    def record_event(self, table, tool_id, kind, operator):
+        return self.call("record_event", table=table, tool_id=tool_id,
+                         kind=kind, operator=operator)
+
+    def record_wear(self, tool_id, values, ts=None, first_run=0):
+        return self.call("record_wear", tool_id=tool_id, values=[float(v) for v in values],
+                         ts=ts, first_run=first_run)
+
+    def wear_trend(self, tool_id=None, table=None, supplier=None, days=90):
+        return self.call("wear_trend", tool_id=tool_id, table=table, supplier=supplier, days=days)
+
+    def wear_suppliers(self, table):
+        return self.call("wear_suppliers", table=table)
+
+
+class DirectBackend(Backend):
+    """直接打开本地数据库文件"""
+
+    def __init__(self):
+        # data_version 需要固定在同一连接上比较
+        self._version_conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        self._version_lock = threading.Lock()
+
+    def call(self, op, **kwargs):
+        with get_conn() as conn:
+            if op in READ_OPS:
+                return READ_OPS[op](conn, **kwargs)
+            if op in WRITE_OPS:
+                conn.execute("BEGIN IMMEDIATE")
+                result = WRITE_OPS[op](conn, **kwargs)
+                conn.commit()
+                return result
+        raise ValueError(f"未知操作：{op}")
+
+    def verify_user(self, uid, pwd):
+        return auth.verify_user(uid, pwd)
+
+    def upsert_user(self, uid, pwd):
+        return auth.upsert_user(uid, pwd)
+
+    def upsert_users(self, users):
+        return auth.upsert_users(users)
+
+    def data_version(self):
+        with self._version_lock:
+            return data_version(self._version_conn)
+
+
+class ServiceError(ValueError):
+    """服务端返回的错误（与直连模式一致，业务校验错误按 ValueError 处理）"""
+
+
+class ServiceBackend(Backend):
+    """通过 HTTP/JSON 访问 tool_service.py；每个线程保持一条长连接"""
+    remote = True
+
+    def __init__(self, url: str, token: str = None, timeout: float = 10.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.token = token if token is not None else os.environ.get(TOKEN_ENV, "")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, method, path, payload=None, idempotent: bool = False):
+        body = json.dumps(payload or {}, ensure_ascii=False).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["X-Token"] = self.token
+        for attempt in (0, 1):
+            conn = self._conn()
+            sent = False
+            try:
+                conn.request(method, path, body, headers)
+                sent = True
+                resp = conn.getresponse()
+                data = json.loads(resp.read())
+                break
+            except (OSError, http.client.HTTPException) as e:
+                # 连接出错或超时后丢弃这条连接；长连接被服务端关闭时重连一次，超时不重试。
+                # 请求已发出后才出错时，写操作可能已经提交，只有只读请求可以重发
+                conn.close()
+                self._local.conn = None
+                if attempt or isinstance(e, TimeoutError) or (sent and not idempotent):
+                    raise
+        if not data.get("ok"):
+            raise ServiceError(data.get("error", f"HTTP {resp.status}"))
+        return data.get("result")
+
+    def call(self, op, **kwargs):
+        return self._request("POST", f"/rpc/{op}", kwargs, idempotent=op in READ_OPS)
+
+    def data_version(self):
+        return self._request("GET", "/version", idempotent=True)
+
+
+_backend = None
+
+def set_backend(backend: Backend):
+    global _backend
+    _backend = backend
+
+def get_backend() -> Backend:
+    """返回当前后端；设置了环境变量 TOOLS_SERVICE_URL 时使用服务模式"""
+    global _backend
+    if _backend is None:
+        url = os.environ.get(SERVICE_ENV)
+        _backend = ServiceBackend(url) if url else DirectBackend()
+    return _backend
@@ -0,0 +1,327 @@
+# backup.py
+# 数据库在线备份：基于 SQLite 备份 API，在后台线程中每次复制少量页并短暂让出，
+# 界面中的查询和编辑不会被长时间阻塞。备份先写入临时文件，完整性检查通过后才改名为正式快照。
+#
+#   python backup.py now                     # 立即备份
+#   python backup.py list                    # 列出快照及检查结果
+#   python backup.py verify 快照文件
+#   python backup.py restore 快照文件        # 恢复（会先给当前数据库做一份快照）
+#   python backup.py bench --rows 200000     # 测量备份期间查询/编辑延迟（在临时副本上进行）
+#
+# 备份间隔、保留份数和备份目录保存在 app_settings 中：
+#   backup_interval_hours（默认 24）、backup_keep（默认 7）、backup_dir（默认 程序目录/backups）
+
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import pathlib
+import argparse
+import tempfile
+import threading
+
+from db import DB_FILE, ROOT, get_setting, set_setting
+
+BACKUP_DIR   = ROOT / "backups"
+PAGES_STEP   = 256         # 每步复制的页数（默认页大小 4 KB，即每步约 1 MB，复制耗时 1~2 ms）
+STEP_PAUSE   = 0.002       # 每步之间让出的秒数，期间其他连接可以读写
+MAX_RESTARTS = 2           # 源库被其他连接修改时备份会从头开始；超过次数后改为一次性复制
+INTERVAL_HOURS = 24
+KEEP = 7
+PREFIX = "tools-"
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _settings(db_file):
+    with sqlite3.connect(db_file) as conn:
+        return (float(get_setting(conn, "backup_interval_hours", INTERVAL_HOURS)),
+                int(get_setting(conn, "backup_keep", KEEP)),
+                pathlib.Path(get_setting(conn, "backup_dir", "") or BACKUP_DIR),
+                float(get_setting(conn, "backup_last", 0)))
+
+
+def integrity_check(path) -> list:
+    """对快照做 PRAGMA integrity_check，返回问题列表（空列表表示完好）"""
+    conn = sqlite3.connect(f"file:{pathlib.Path(path).as_posix()}?mode=ro", uri=True)
+    try:
+        rows = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    finally:
+        conn.close()
+    return [] if rows == ["ok"] else rows
+
+
+def copy_online(src_file, dst_file, pages: int = PAGES_STEP, pause: float = STEP_PAUSE):
+    """
+    用备份 API 把 src_file 复制到 dst_file。每步 pages 页，步间休眠 pause 秒。
+
+    WAL 模式（服务模式）下先在源连接上开启读事务，整个备份读取同一个一致快照，
+    其他连接照常提交，不会打断备份。回滚日志模式下读事务会挡住写入，只能逐步复制：
+    源库在备份期间被其他连接提交修改时，SQLite 会从头重新复制；界面上的编辑是零星的，
+    重来一两次通常就能完成，连续重来超过 MAX_RESTARTS 次后改为一步复制完
+    （只在这一步内阻塞写入，约每 MB 1~2 ms）。返回重来的次数。
+    """
+    restarts = 0
+    last = None
+
+    def progress(status, remaining, total):
+        nonlocal last
+        if last is not None and remaining >= last:     # 没有进展即说明已从头重来
+            raise _Restarted
+        last = remaining
+        if pause:
+            time.sleep(pause)
+
+    src = sqlite3.connect(src_file, isolation_level=None)
+    dst = sqlite3.connect(dst_file)
+    try:
+        if src.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            src.execute("BEGIN")
+            src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        while True:
+            try:
+                src.backup(dst, pages=pages, progress=progress, sleep=0.005)
+                break
+            except _Restarted:
+                restarts += 1
+                last = None
+                if restarts > MAX_RESTARTS:
+                    pages = -1
+    finally:
+        dst.close()
+        src.close()
+    return restarts
+
+
+def snapshot(db_file=None, dest_dir=None, pages: int = PAGES_STEP, pause: float = STEP_PAUSE):
+    """生成一份经过完整性检查的快照，返回快照路径；检查失败时抛出 RuntimeError"""
+    db_file = db_file or DB_FILE
+    if dest_dir is None:
+        dest_dir = _settings(db_file)[2]
+    dest_dir = pathlib.Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    final = dest_dir / f"{PREFIX}{stamp}.db"
+    n = 1
+    while final.exists():
+        final = dest_dir / f"{PREFIX}{stamp}-{n}.db"
+        n += 1
+    part = final.with_suffix(".part")
+    try:
+        copy_online(db_file, part, pages, pause)
+        problems = integrity_check(part)
+        if problems:
+            raise RuntimeError(f"快照完整性检查失败：{problems[0]}")
+        os.replace(part, final)
+    finally:
+        if part.exists():
+            part.unlink()
+    with sqlite3.connect(db_file) as conn:
+        set_setting(conn, "backup_last", str(time.time()))
+        conn.commit()
+    return final
+
+
+def list_snapshots(dest_dir=None, db_file=None):
+    """按时间从新到旧列出快照"""
+    if dest_dir is None:
+        dest_dir = _settings(db_file or DB_FILE)[2]
+    dest_dir = pathlib.Path(dest_dir)
+    if not dest_dir.is_dir():
+        return []
+    return sorted(dest_dir.glob(f"{PREFIX}*.db"), key=lambda p: p.stat().st_mtime, reverse=True)
+
+
+def prune(keep: int, dest_dir=None, db_file=None):
+    """只保留最新的 keep 份快照，返回删除的文件"""
+    removed = list_snapshots(dest_dir, db_file)[max(keep, 1):]
+    for p in removed:
+        p.unlink()
+    return removed
+
+
+def restore(path, db_file=None):
+    """
+    用快照覆盖当前数据库。先检查快照并给当前数据库做一份快照，
+    再用备份 API 写回（其他连接随后读到的是恢复后的内容）。
+    """
+    db_file = db_file or DB_FILE
+    problems = integrity_check(path)
+    if problems:
+        raise RuntimeError(f"快照已损坏，拒绝恢复：{problems[0]}")
+    safety = snapshot(db_file)
+    src = sqlite3.connect(path)
+    dst = sqlite3.connect(db_file, timeout=30)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    return safety
+
+
+class BackupScheduler:
+    """
+    定时备份线程：距上次备份超过 backup_interval_hours 时生成快照并按 backup_keep 清理旧快照。
+    run_now() 请求立即备份；on_done(快照路径或 None, 错误信息或 None) 在备份线程中调用。
+    """
+
+    def __init__(self, db_file=None, on_done=None, check_every: float = 60.0):
+        self.db_file = db_file or DB_FILE
+        self.on_done = on_done
+        self.check_every = check_every
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._forced = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="db-backup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+
+    def run_now(self):
+        self._forced = True
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                interval, keep, dest, last = _settings(self.db_file)
+                if self._forced or time.time() - last >= interval * 3600:
+                    self._forced = False
+                    path = snapshot(self.db_file, dest)
+                    prune(keep, dest)
+                    if self.on_done:
+                        self.on_done(str(path), None)
+            except (sqlite3.Error, OSError, RuntimeError) as e:
+                self._forced = False
+                if self.on_done:
+                    self.on_done(None, str(e))
+            self._wake.wait(self.check_every)
+            self._wake.clear()
+
+
+# —— 性能测试 —— #
+def _percentile(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * q))] * 1000 if xs else 0.0
+
+
+def _measure(db_file, stop, out, interval):
+    """模拟界面操作：读取首屏 256 行（QSqlTableModel 的首次 fetch）+ 修改一个单元格并提交"""
+    conn = sqlite3.connect(db_file, timeout=30)
+    ids = [r[0] for r in conn.execute("SELECT rowid FROM drill_tools LIMIT 1000")]
+    i = 0
+    out["ready"].set()
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        conn.execute("SELECT * FROM drill_tools WHERE 刀具编号 LIKE ? LIMIT 256", (f"%{i % 10}%",)).fetchall()
+        t1 = time.perf_counter()
+        conn.execute("UPDATE drill_tools SET 使用次数=使用次数+1 WHERE rowid=?", (ids[i % len(ids)],))
+        conn.commit()
+        t2 = time.perf_counter()
+        out["load"].append(t1 - t0)
+        out["edit"].append(t2 - t1)
+        i += 1
+        time.sleep(interval)
+    conn.close()
+
+
+def _bench(args):
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="backup-bench-"))
+    try:
+        db_file = tmp / "tools.db"
+        shutil.copy(DB_FILE, db_file)
+        conn = sqlite3.connect(db_file)
+        if args.wal:
+            conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.executemany(
+                "INSERT INTO drill_tools(刀具编号, 刀具型号, 生产商, 刀具属性, 库存位置, 使用次数) "
+                "VALUES(?, ?, ?, ?, ?, 0)",
+                ((f"BENCH-{i:07d}", "DR880-20-5D", "bench", "x" * 200, f"A-{i % 50}")
+                 for i in range(args.rows)))
+        conn.close()
+        size = db_file.stat().st_size / 2 ** 20
+        print(f"测试库 {size:.0f} MB（drill_tools 额外 {args.rows} 行，"
+              f"{'WAL' if args.wal else '回滚日志'}模式，每 {args.edit_interval * 1000:.0f} ms 编辑一次）")
+
+        def run(label, backup=None):
+            stop = threading.Event()
+            out = {"load": [], "edit": [], "ready": threading.Event()}
+            t = threading.Thread(target=_measure, args=(db_file, stop, out, args.edit_interval))
+            t.start()
+            out["ready"].wait()
+            time.sleep(0.2)
+            t0 = time.perf_counter()
+            info = ""
+            if backup is None:
+                time.sleep(args.idle)
+            else:
+                restarts = backup(tmp / "snap.db")
+                info = f"，备份 {time.perf_counter() - t0:.2f} s，重来 {restarts} 次"
+            stop.set()
+            t.join()
+            print(f"{label:<22} 首屏读取 p50 {_percentile(out['load'], .5):6.1f} ms "
+                  f"p99 {_percentile(out['load'], .99):6.1f} ms | 编辑 p50 {_percentile(out['edit'], .5):6.1f} ms "
+                  f"p99 {_percentile(out['edit'], .99):6.1f} ms max {max(out['edit'] or [0]) * 1000:6.1f} ms{info}")
+
+        run("无备份")
+        run("一次性复制", lambda p: copy_online(db_file, p, pages=-1, pause=0))
+        run(f"分步复制 {args.pages} 页/步",
+            lambda p: copy_online(db_file, p, pages=args.pages, pause=args.pause))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="刀具数据库在线备份与恢复")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("now", help="立即备份并按保留份数清理")
+    sub.add_parser("list", help="列出快照")
+    vp = sub.add_parser("verify", help="检查快照完整性")
+    vp.add_argument("snapshot")
+    rp = sub.add_parser("restore", help="用快照恢复数据库（请先关闭主程序和服务）")
+    rp.add_argument("snapshot")
+    bp = sub.add_parser("bench", help="测量备份期间的查询/编辑延迟（在临时副本上进行）")
+    bp.add_argument("--rows", type=int, default=200_000)
+    bp.add_argument("--pages", type=int, default=PAGES_STEP)
+    bp.add_argument("--pause", type=float, default=STEP_PAUSE)
+    bp.add_argument("--idle", type=float, default=3.0, help="无备份基线的测量秒数")
+    bp.add_argument("--edit-interval", type=float, default=0.05, help="模拟编辑的间隔秒数")
+    bp.add_argument("--wal", action="store_true", help="测试库使用 WAL 模式（与服务模式相同）")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "now":
+        _, keep, dest, _ = _settings(DB_FILE)
+        path = snapshot(DB_FILE, dest)
+        prune(keep, dest)
+        print(f"已备份到 {path}")
+    elif args.cmd == "list":
+        for p in list_snapshots():
+            problems = integrity_check(p)
+            print(f"{p}  {p.stat().st_size / 2 ** 20:.1f} MB  {'完好' if not problems else problems[0]}")
+    elif args.cmd == "verify":
+        problems = integrity_check(args.snapshot)
+        print("完好" if not problems else "\n".join(problems))
+        return 1 if problems else 0
+    elif args.cmd == "restore":
+        safety = restore(args.snapshot)
+        print(f"已恢复；恢复前的数据库已保存为 {safety}")
+    else:
+        _bench(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+# csv_loader.py
+# 传感器 CSV 读取：只读取模型需要的列并指定类型（特征 float32、material int8），
+# 读取后用 NumPy 向量化检查缺失值和取值范围，返回数据质量报告。
+# PredictWorker 和监控文件夹共用。
+#
+#   python csv_loader.py check testing_mill.csv     # 打印数据质量报告
+#   python csv_loader.py bench --rows 2000000       # 对比默认 read_csv 的耗时和内存
+
+import os
+import sys
+import time
+import difflib
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+from predictor import FEAT_COLS
+
+try:
+    import pyarrow  # noqa: F401
+    ENGINE = "pyarrow"
+except ImportError:
+    ENGINE = "c"
+
+ENCODING = "utf-8-sig"          # 采集软件导出的文件带 BOM
+MATERIALS = (1, 2)
+# 各特征允许的取值范围（闭区间）；传感器通道为 ±10 V 采集卡
+VALUE_RANGES = {
+    "time":        (0, 1e5),
+    "DOC":         (0, 10),
+    "feed":        (0, 5),
+    "smcAC":       (-10, 10),
+    "smcDC":       (-10, 10),
+    "vib_table":   (-10, 10),
+    "vib_spindle": (-10, 10),
+    "AE_table":    (-10, 10),
+    "AE_spindle":  (-10, 10),
+}
+DTYPES = {**{c: np.float32 for c in FEAT_COLS}, "material": np.int8}
+REQUIRED = list(DTYPES)
+
+
+class DataQualityReport:
+    """一次读取的数据质量报告；summary() 给出可直接展示的文字"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.engine = ENGINE
+        self.rows = 0                 # 数据行数
+        self.valid_rows = 0           # 通过检查、参与预测的行数
+        self.missing_columns = []     # 缺少的必需列
+        self.suggestions = {}         # 缺少的列 -> 文件中名称相近的列
+        self.renamed = {}             # 仅大小写/空白不同而自动对应的列：文件列名 -> 标准列名
+        self.missing_values = {}      # 列 -> 空值/非有限值个数
+        self.non_numeric = {}         # 列 -> 无法解析为数值的个数
+        self.out_of_range = {}        # 列 -> 超出 VALUE_RANGES 的个数
+        self.bad_material = 0         # material 不在 MATERIALS 中的行数
+        self.dropped = []             # 被剔除的行号（前 20 个，从 0 开始）
+        self.seconds = 0.0
+        self.nbytes = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing_columns and self.valid_rows > 0
+
+    @property
+    def clean(self) -> bool:
+        return self.ok and self.valid_rows == self.rows and not self.renamed
+
+    def summary(self) -> str:
+        name = os.path.basename(self.path)
+        if self.missing_columns:
+            lines = [f"{name} 缺少特征列：{', '.join(self.missing_columns)}"]
+            for col, near in self.suggestions.items():
+                lines.append(f"  {col} 可能是：{', '.join(near)}")
+            return "\n".join(lines)
+        lines = [f"{name}：{self.rows} 行，{self.valid_rows} 行可用"]
+        if self.renamed:
+            lines.append("列名已自动对应：" + ", ".join(f"{a}→{b}" for a, b in self.renamed.items()))
+        for label, counts in (("无法解析为数值", self.non_numeric), ("缺失值", self.missing_values),
+                              ("超出范围", self.out_of_range)):
+            counts = {c: n for c, n in counts.items() if n}
+            if counts:
+                lines.append(f"{label}：" + ", ".join(f"{c} {n}" for c, n in counts.items()))
+        if self.bad_material:
+            lines.append(f"material 不是 {'/'.join(map(str, MATERIALS))}：{self.bad_material} 行")
+        if self.dropped:
+            more = "…" if self.rows - self.valid_rows > len(self.dropped) else ""
+            lines.append(f"已剔除行：{', '.join(map(str, self.dropped))}{more}")
+        if not self.valid_rows:
+            lines.append("没有可用的数据行")
+        return "\n".join(lines)
+
+
+class CsvSchemaError(ValueError):
+    """缺少必需列或没有可用数据行；report 为完整的数据质量报告"""
+
+    def __init__(self, report: DataQualityReport):
+        super().__init__(report.summary())
+        self.report = report
+
+
+def _match_columns(header, report):
+    """把文件列名对应到标准列名，返回 {文件列名: 标准列名}"""
+    by_norm = {str(c).strip().lower(): c for c in header}
+    colmap = {}
+    for col in REQUIRED:
+        src = col if col in header else by_norm.get(col.lower())
+        if src is None:
+            report.missing_columns.append(col)
+            near = difflib.get_close_matches(col, [str(c) for c in header], n=3, cutoff=0.6)
+            if near:
+                report.suggestions[col] = near
+            continue
+        if src != col:
+            report.renamed[src] = col
+        colmap[src] = col
+    return colmap
+
+
+def _read(path, colmap, report):
+    """按指定类型读取；有非数值内容时退回逐列解析并计数"""
+    try:
+        return pd.read_csv(path, usecols=list(colmap), encoding=ENCODING, engine=ENGINE,
+                           dtype={src: DTYPES[dst] for src, dst in colmap.items()})
+    except (ValueError, TypeError):
+        pass
+    df = pd.read_csv(path, usecols=list(colmap), encoding=ENCODING, dtype=str)
+    for src in colmap:
+        raw = df[src]
+        num = pd.to_numeric(raw, errors="coerce")
+        report.non_numeric[colmap[src]] = int((num.isna() & raw.notna()).sum())
+        df[src] = num.astype(np.float32)
+    return df
+
+
+def load_sensor_csv(path: str):
+    """
+    读取传感器 CSV，返回 (DataFrame, DataQualityReport)。
+    DataFrame 只含 FEAT_COLS 和 material，只保留通过检查的行，索引为原始行号。
+    缺少必需列或没有可用行时抛出 CsvSchemaError。
+    """
+    t0 = time.perf_counter()
+    report = DataQualityReport(path)
+    header = list(pd.read_csv(path, nrows=0, encoding=ENCODING).columns)
+    colmap = _match_columns(header, report)
+    if report.missing_columns:
+        raise CsvSchemaError(report)
+    df = _read(path, colmap, report).rename(columns=colmap)
+    report.rows = len(df)
+
+    feats = df[FEAT_COLS].to_numpy(dtype=np.float32)
+    lo = np.array([VALUE_RANGES[c][0] for c in FEAT_COLS], dtype=np.float32)
+    hi = np.array([VALUE_RANGES[c][1] for c in FEAT_COLS], dtype=np.float32)
+    finite = np.isfinite(feats)
+    in_range = (feats >= lo) & (feats <= hi)          # NaN 比较结果为 False
+    mat = df["material"].to_numpy()
+    mat_ok = np.isin(mat, MATERIALS)                   # NaN 不在其中
+    keep = (finite & in_range).all(axis=1) & mat_ok
+
+    # 无法解析的值已变为 NaN，缺失值中不重复计数
+    report.missing_values = {c: n - report.non_numeric.get(c, 0)
+                             for c, n in zip(FEAT_COLS, (~finite).sum(axis=0).tolist())}
+    n_nan = int(np.isnan(mat).sum()) if mat.dtype.kind == "f" else 0
+    report.missing_values["material"] = n_nan - report.non_numeric.get("material", 0)
+    report.out_of_range = dict(zip(FEAT_COLS, (finite & ~in_range).sum(axis=0).tolist()))
+    report.bad_material = int((~mat_ok).sum()) - n_nan
+    report.dropped = np.flatnonzero(~keep)[:20].tolist()
+    report.valid_rows = int(keep.sum())
+
+    if not keep.all():
+        df = df[keep]
+    df = df[REQUIRED].astype({"material": np.int8})
+    report.seconds = time.perf_counter() - t0
+    report.nbytes = int(df.memory_usage(index=True).sum())
+    if not report.ok:
+        raise CsvSchemaError(report)
+    return df, report
+
+
+# —— 性能测试 —— #
+def _make_csv(path, rows):
+    """生成与 testing_mill.csv 同格式（BOM、无名索引列、case/run 列）的测试文件"""
+    rnd = np.random.default_rng(0)
+    chunk = 200_000
+    with open(path, "w", encoding=ENCODING, newline="") as f:
+        f.write(",case,run," + ",".join(FEAT_COLS[:3]) + ",material," + ",".join(FEAT_COLS[3:]) + "\n")
+        for start in range(0, rows, chunk):
+            n = min(chunk, rows - start)
+            idx = np.arange(start, start + n)
+            df = pd.DataFrame({
+                "": [f"row_{i}" for i in idx], "case": idx // 1000 + 1, "run": idx % 1000 + 1,
+                "time": (idx % 1000) * 2.0, "DOC": 1.5, "feed": 0.5, "material": idx % 2 + 1,
+                **{c: rnd.normal(0.3, 0.2, n) for c in FEAT_COLS[3:]},
+            })
+            df.to_csv(f, header=False, index=False)
+
+
+def _measure(mode, path):
+    import resource
+    t0 = time.perf_counter()
+    if mode == "default":
+        df = pd.read_csv(path)
+    else:
+        df, _ = load_sensor_csv(path)
+    dt = time.perf_counter() - t0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{dt:.3f} {df.memory_usage(index=True, deep=True).sum() / 2 ** 20:.1f} {rss:.0f}")
+
+
+def _bench(args):
+    tmp = tempfile.mkdtemp(prefix="csv-bench-")
+    path = os.path.join(tmp, "sensor.csv")
+    _make_csv(path, args.rows)
+    print(f"{args.rows} 行，{os.path.getsize(path) / 2 ** 20:.0f} MB，引擎 {ENGINE}")
+    try:
+        for mode, label in (("default", "pd.read_csv 默认"), ("loader", "load_sensor_csv")):
+            # 每种方式在独立进程中运行，峰值内存互不影响
+            out = subprocess.run([sys.executable, __file__, "_measure", mode, path],
+                                 capture_output=True, text=True, check=True).stdout.split()
+            dt, frame, rss = map(float, out[-3:])
+            print(f"{label:<18} {dt:7.2f} s   DataFrame {frame:7.1f} MB   进程峰值 {rss:6.0f} MB")
+    finally:
+        os.remove(path)
+        os.rmdir(tmp)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="传感器 CSV 读取与数据质量检查")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    cp = sub.add_parser("check", help="打印数据质量报告")
+    cp.add_argument("csv")
+    bp = sub.add_parser("bench", help="对比默认 read_csv 的耗时和内存")
+    bp.add_argument("--rows", type=int, default=2_000_000)
+    mp = sub.add_parser("_measure")
+    mp.add_argument("mode")
+    mp.add_argument("csv")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "bench":
+        _bench(args)
+    elif args.cmd == "_measure":
+        _measure(args.mode, args.csv)
+    else:
+        try:
+            _, report = load_sensor_csv(args.csv)
+        except CsvSchemaError as e:
+            print(e)
+            return 1
+        print(report.summary())
+        print(f"引擎 {report.engine}，{report.seconds * 1000:.1f} ms，{report.nbytes / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 # db.py
+import time
 import hashlib
 import sqlite3
 import pathlib
@@ -58,9 +59,211 @@ DDL_MAP = {
         );""")
 }
 
-def init_all_tables():
-    """初始化 users 表和 4 张刀具表"""
-    with sqlite3.connect(DB_FILE) as conn:
+# 各刀具表中“刀具状况”字段名不统一，统计时按表取列名
+COND_COL = {
+    "drill_tools":          "刀具状况",
+    "indexable_mill_tools": "刀具状况",
+    "solid_mill_tools":     "刀具状态",
+    "turning_inserts":      "刀具状态",
+}
+COND_KEYS = ("新", "良好", "差")
+TABLE_LABELS = {
+    "drill_tools":          "孔加工刀具",
+    "indexable_mill_tools": "可转位铣刀刀具",
+    "solid_mill_tools":     "固定铣刀刀具",
+    "turning_inserts":      "车削刀片",
+}
+
+# 借还事件日志（只追加）+ 由触发器维护的“当前持有”物化表
+EVENTS_DDL = textwrap.dedent("""
+    CREATE TABLE IF NOT EXISTS tool_events(
+        id       INTEGER PRIMARY KEY AUTOINCREMENT,
+        刀具编号 TEXT NOT NULL,
+        刀具表   TEXT NOT NULL,
+        事件类型 TEXT NOT NULL CHECK(事件类型 IN ('borrow','return','regrind','scrap')),
+        操作人   TEXT NOT NULL,
+        事件时间 TEXT NOT NULL DEFAULT (datetime('now','localtime'))
+    );
+    CREATE INDEX IF NOT EXISTS idx_events_tool ON tool_events(刀具编号, 事件时间);
+    CREATE INDEX IF NOT EXISTS idx_events_user ON tool_events(操作人, 事件时间);
+    CREATE INDEX IF NOT EXISTS idx_events_time ON tool_events(事件时间);
+
+    CREATE TABLE IF NOT EXISTS tool_holdings(
+        刀具表   TEXT NOT NULL,
+        刀具编号 TEXT NOT NULL,
+        借用人   TEXT NOT NULL,
+        借用时间 TEXT NOT NULL,
+        PRIMARY KEY(刀具表, 刀具编号)
+    );
+    CREATE INDEX IF NOT EXISTS idx_holdings_user ON tool_holdings(借用人);
+
+    CREATE TRIGGER IF NOT EXISTS trg_events_no_update BEFORE UPDATE ON tool_events
+    BEGIN SELECT RAISE(ABORT, 'tool_events 只允许追加'); END;
+    CREATE TRIGGER IF NOT EXISTS trg_events_no_delete BEFORE DELETE ON tool_events
+    BEGIN SELECT RAISE(ABORT, 'tool_events 只允许追加'); END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_events_holdings AFTER INSERT ON tool_events
+    BEGIN
+        DELETE FROM tool_holdings
+         WHERE 刀具表=NEW.刀具表 AND 刀具编号=NEW.刀具编号
+           AND NEW.事件类型 IN ('return','scrap');
+        INSERT INTO tool_holdings(刀具表, 刀具编号, 借用人, 借用时间)
+        SELECT NEW.刀具表, NEW.刀具编号, NEW.操作人, NEW.事件时间
+         WHERE NEW.事件类型='borrow'
+        ON CONFLICT(刀具表, 刀具编号) DO UPDATE
+           SET 借用人=excluded.借用人, 借用时间=excluded.借用时间;
+    END;
+""")
+
+# 事件同时回写刀具表中原有的 借用人/借用时间/归还时间/库存状态/使用次数 列，
+# 保持刀具信息界面显示一致
+EVENT_SYNC_TRIGGER = textwrap.dedent("""
+    CREATE TRIGGER IF NOT EXISTS trg_events_sync_{table} AFTER INSERT ON tool_events
+    WHEN NEW.刀具表='{table}'
+    BEGIN
+        UPDATE {table} SET
+            借用人   = CASE NEW.事件类型 WHEN 'borrow' THEN NEW.操作人 ELSE 借用人 END,
+            借用时间 = CASE NEW.事件类型 WHEN 'borrow' THEN NEW.事件时间 ELSE 借用时间 END,
+            归还时间 = CASE NEW.事件类型 WHEN 'return' THEN NEW.事件时间
+                                         WHEN 'borrow' THEN NULL ELSE 归还时间 END,
+            库存状态 = CASE NEW.事件类型 WHEN 'borrow' THEN '借出'
+                                         WHEN 'return' THEN '在库'
+                                         WHEN 'scrap'  THEN '报废' ELSE 库存状态 END,
+            使用次数 = COALESCE(使用次数, 0) + (NEW.事件类型='borrow')
+         WHERE 刀具编号=NEW.刀具编号;
+    END;
+""")
+
+# 磨损预测结果（监控文件夹自动分析等）；(文件路径, 文件大小, 修改时间) 唯一，防止重复处理
+RESULTS_DDL = textwrap.dedent("""
+    CREATE TABLE IF NOT EXISTS analysis_results(
+        id       INTEGER PRIMARY KEY AUTOINCREMENT,
+        文件路径 TEXT NOT NULL,
+        文件大小 INTEGER NOT NULL,
+        修改时间 INTEGER NOT NULL,
+        状态     TEXT NOT NULL DEFAULT 'queued',
+        刀具编号 TEXT,
+        分析时间 TEXT,
+        样本数   INTEGER,
+        最大VB   REAL,
+        平均VB   REAL,
+        最终VB   REAL,
+        预测值   TEXT,
+        错误     TEXT,
+        UNIQUE(文件路径, 文件大小, 修改时间)
+    );
+    CREATE INDEX IF NOT EXISTS idx_results_state ON analysis_results(状态);
+""")
+
+# 内容寻址图片库（见 image_store.py）：每张图片按 SHA-256 只存一份，刀具表用 图片哈希 引用
+IMAGES_DDL = textwrap.dedent("""
+    CREATE TABLE IF NOT EXISTS images(
+        哈希     TEXT PRIMARY KEY,
+        大小     INTEGER NOT NULL,
+        格式     TEXT,
+        宽       INTEGER,
+        高       INTEGER,
+        入库时间 TEXT NOT NULL DEFAULT (datetime('now','localtime'))
+    );
+""")
+
+# 磨损历史（见 wear_history.py）：逐次预测 VB 按 (刀具编号, 时间, 运行) 聚簇存放，
+# wear_rollup 为按小时/按天预聚合的趋势（级别为时段秒数），趋势查询只读聚合表
+WEAR_DDL = textwrap.dedent("""
+    CREATE TABLE IF NOT EXISTS wear_history(
+        刀具编号 TEXT NOT NULL,
+        时间     INTEGER NOT NULL,
+        运行     INTEGER NOT NULL,
+        VB       REAL NOT NULL,
+        PRIMARY KEY(刀具编号, 时间, 运行)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS wear_rollup(
+        级别     INTEGER NOT NULL,
+        刀具编号 TEXT NOT NULL,
+        时段     INTEGER NOT NULL,
+        点数     INTEGER NOT NULL,
+        最大VB   REAL,
+        最小VB   REAL,
+        合计VB   REAL,
+        PRIMARY KEY(级别, 刀具编号, 时段)
+    ) WITHOUT ROWID;
+""")
+
+# 库存汇总（由触发器增量维护）：每类刀具按 维度 × 取值 × 状况 计数，可视化界面只读这张表
+ROLLUP_DIMS = {
+    "生产商":       "COALESCE({r}.生产商, '')",
+    "刀具材料":     "COALESCE({r}.刀具材料, '')",
+    "适合加工材料": "COALESCE({r}.适合加工材料, '')",
+    "库存位置":     "COALESCE({r}.库存位置, '')",
+    "库存状态":     "COALESCE({r}.库存状态, '')",
+    "使用次数":     """CASE WHEN COALESCE({r}.使用次数, 0) <= 0 THEN '0'
+                           WHEN {r}.使用次数 < 10  THEN '1-9'
+                           WHEN {r}.使用次数 < 50  THEN '10-49'
+                           WHEN {r}.使用次数 < 100 THEN '50-99'
+                           WHEN {r}.使用次数 < 200 THEN '100-199'
+                           ELSE '200+' END""",
+}
+USAGE_BUCKETS = ("0", "1-9", "10-49", "50-99", "100-199", "200+")
+
+ROLLUP_DDL = textwrap.dedent("""
+    CREATE TABLE IF NOT EXISTS inventory_rollup(
+        刀具表 TEXT NOT NULL,
+        维度   TEXT NOT NULL,
+        取值   TEXT NOT NULL,
+        状况   TEXT NOT NULL,
+        数量   INTEGER NOT NULL,
+        PRIMARY KEY(刀具表, 维度, 取值, 状况)
+    ) WITHOUT ROWID;
+""")
+
+def _rollup_upsert(table: str, r: str, delta: int) -> str:
+    """触发器体中的一条语句：把 NEW/OLD 行计入（delta=1）或移出（delta=-1）各维度"""
+    cond = f"COALESCE({r}.{COND_COL[table]}, '')"
+    values = ",\n".join(f"('{table}', '{dim}', {expr.format(r=r)}, {cond}, {delta})"
+                         for dim, expr in ROLLUP_DIMS.items())
+    return (f"INSERT INTO inventory_rollup(刀具表, 维度, 取值, 状况, 数量) VALUES\n{values}\n"
+            f"ON CONFLICT(刀具表, 维度, 取值, 状况) DO UPDATE SET 数量=数量+excluded.数量;")
+
+def rollup_triggers(table: str) -> str:
+    """某张刀具表的插入/删除/更新触发器"""
+    cols = ", ".join([*ROLLUP_DIMS, COND_COL[table]])
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_ins_{table} AFTER INSERT ON {table}
+        BEGIN
+            {_rollup_upsert(table, "NEW", 1)}
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_del_{table} AFTER DELETE ON {table}
+        BEGIN
+            {_rollup_upsert(table, "OLD", -1)}
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_upd_{table} AFTER UPDATE OF {cols} ON {table}
+        BEGIN
+            {_rollup_upsert(table, "OLD", -1)}
+            {_rollup_upsert(table, "NEW", 1)}
+        END;
+    """
+
+def rebuild_rollups(conn):
+    """按刀具表全量重算库存汇总（首次建表或校验不一致时使用，不提交）"""
+    conn.execute("DELETE FROM inventory_rollup")
+    for table in DDL_MAP:
+        cond = f"COALESCE({COND_COL[table]}, '')"
+        for dim, expr in ROLLUP_DIMS.items():
+            conn.execute(f"""
+                INSERT INTO inventory_rollup(刀具表, 维度, 取值, 状况, 数量)
+                SELECT ?, ?, {expr.format(r=table)}, {cond}, COUNT(*)
+                  FROM {table} GROUP BY 3, 4
+            """, (table, dim))
+
+def _add_column(conn, table: str, column: str, decl: str):
+    """旧数据库迁移：字段不存在时追加"""
+    cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in cols:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+def init_all_tables(db_file=None):
+    """初始化 users 表和 4 张刀具表（db_file 默认为 DB_FILE）"""
+    with sqlite3.connect(db_file or DB_FILE) as conn:
         # 用户表
         conn.execute("""
             CREATE TABLE IF NOT EXISTS users(
@@ -68,15 +271,73 @@ def init_all_tables():
                 密码 TEXT NOT NULL
             );
         """)
+        # 系统参数（键值对）
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS app_settings(
+                键 TEXT PRIMARY KEY,
+                值 TEXT
+            );
+        """)
         # 刀具表
         for ddl in DDL_MAP.values():
             conn.executescript(ddl)
+        # 借还事件日志
+        conn.executescript(EVENTS_DDL)
+        for table in DDL_MAP:
+            conn.executescript(EVENT_SYNC_TRIGGER.format(table=table))
+        # 磨损预测结果
+        conn.executescript(RESULTS_DDL)
+        # 图片库；刀具表追加 图片哈希 字段
+        conn.executescript(IMAGES_DDL)
+        for table in DDL_MAP:
+            _add_column(conn, table, "图片哈希", "TEXT")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_image ON {table}(图片哈希)")
+        # 磨损历史；“天”聚合按本机时区的零点划分，首次建库时记下 UTC 偏移（旧版按 UTC 划分的聚合随之重建）
+        conn.executescript(WEAR_DDL)
+        if get_setting(conn, "wear_tz_offset") is None:
+            import wear_history
+            wear_history.set_tz_offset(conn, time.localtime().tm_gmtoff)
+        # 库存汇总：首次建表时按现有数据初始化，之后由触发器维护
+        fresh = not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name='inventory_rollup'").fetchone()
+        conn.executescript(ROLLUP_DDL)
+        for table in DDL_MAP:
+            conn.executescript(rollup_triggers(table))
+        if fresh:
+            rebuild_rollups(conn)
+        # 首次建表时，用旧的“借出”记录初始化当前持有表
+        if not conn.execute("SELECT 1 FROM tool_events LIMIT 1").fetchone():
+            for table in DDL_MAP:
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO tool_holdings(刀具表, 刀具编号, 借用人, 借用时间)
+                    SELECT ?, 刀具编号, 借用人, COALESCE(借用时间, '')
+                      FROM {table}
+                     WHERE 库存状态='借出' AND 借用人 IS NOT NULL
+                """, (table,))
         conn.commit()
 
 def get_conn():
     """返回 sqlite3.Connection"""
     return sqlite3.connect(DB_FILE)
 
+def data_version(conn) -> int:
+    """
+    返回 PRAGMA data_version。其他连接每提交一次，该值就会变化，
+    可用来低成本判断数据库是否被修改过（同一连接自身的写入不计）。
+    """
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+def get_setting(conn, key: str, default=None):
+    row = conn.execute("SELECT 值 FROM app_settings WHERE 键=?", (key,)).fetchone()
+    return row[0] if row else default
+
+def set_setting(conn, key: str, value: str):
+    """写入系统参数（不提交）"""
+    conn.execute("""
+        INSERT INTO app_settings(键, 值) VALUES(?, ?)
+        ON CONFLICT(键) DO UPDATE SET 值=excluded.值
+    """, (key, value))
+
 def hash_pwd(pwd: str, salt: str = "g!8$") -> str:
-    """SHA-256 + 简单盐"""
+    """旧版口令哈希：SHA-256 + 固定盐。仅用于校验旧数据，登录成功后会升级为 KDF 哈希"""
     return hashlib.sha256((pwd + salt).encode()).hexdigest()
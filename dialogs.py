@@ -1,30 +1,119 @@
 # dialogs.py
+from PySide6.QtCore    import QThread, Signal
 from PySide6.QtWidgets import QDialog, QMessageBox
 from Login_module            import Ui_Confirm_password_recovery as UiLogin
 from Password_change_module import Ui_Form                    as UiChange
 from Password_recovery_module import Ui_Form                  as UiReset
-from auth import verify_user, upsert_user
+from backend import get_backend
 
 # 固定验证码
 FIXED_CODE = "i love sau"
 
+class VerifyWorker(QThread):
+    """在后台线程中校验口令（KDF 计算耗时），避免登录对话框卡住"""
+    done = Signal(bool, str)
+
+    def __init__(self, uid, pwd):
+        super().__init__()
+        self.uid = uid
+        self.pwd = pwd
+
+    def run(self):
+        try:
+            self.done.emit(get_backend().verify_user(self.uid, self.pwd), "")
+        except Exception as e:
+            self.done.emit(False, str(e))
+
+
+class UpsertWorker(QThread):
+    """在后台线程中设置口令（KDF 计算或服务端请求耗时）；done(错误信息)，成功时为空"""
+    done = Signal(str)
+
+    def __init__(self, uid, pwd):
+        super().__init__()
+        self.uid = uid
+        self.pwd = pwd
+
+    def run(self):
+        try:
+            get_backend().upsert_user(self.uid, self.pwd)
+            self.done.emit("")
+        except Exception as e:
+            self.done.emit(str(e) or type(e).__name__)
+
+
+class _SavePwdDialog(QDialog):
+    """修改/找回密码的公共部分：口令在 UpsertWorker 中写入，期间按钮不可用"""
+
+    def __init__(self, ui, confirm: str, parent=None):
+        super().__init__(parent)
+        self.ui = ui
+        self.ui.setupUi(self)
+        self.worker = None
+        self._buttons = (getattr(self.ui, confirm), self.ui.Return_to_the_login_page)
+        self._buttons[0].clicked.connect(self.on_ok)
+        self.ui.Return_to_the_login_page.clicked.connect(self.reject)
+
+    def _save(self, uid, pwd, message):
+        self._message = message
+        for b in self._buttons:
+            b.setEnabled(False)
+        self.worker = UpsertWorker(uid, pwd)
+        self.worker.done.connect(self._on_saved)
+        self.worker.start()
+
+    def _on_saved(self, err):
+        self.worker.wait()
+        self.worker = None
+        for b in self._buttons:
+            b.setEnabled(True)
+        if err:
+            QMessageBox.warning(self, "失败", f"无法保存密码：{err}")
+            return
+        QMessageBox.information(self, "成功", self._message)
+        self.accept()
+
+    def reject(self):
+        # 写入过程中不能关闭，否则线程仍在运行时对话框被销毁
+        if self.worker is None:
+            super().reject()
+
+
 class LoginDialog(QDialog):
     def __init__(self):
         super().__init__()
         self.ui = UiLogin()
         self.ui.setupUi(self)
         self.user = ""
+        self.worker = None
         self.ui.Login.clicked.connect(self.do_login)
         self.ui.Change_password.clicked.connect(self.open_change)
         self.ui.Password_recovery.clicked.connect(self.open_reset)
         self.ui.Exit.clicked.connect(self.reject)
 
     def do_login(self):
+        if self.worker is not None:
+            return
         uid = self.ui.EmployeeID.text().strip()
         pwd = self.ui.Password.text()
-        if verify_user(uid, pwd):
+        self._login_text = self.ui.Login.text()
+        self.ui.Login.setEnabled(False)
+        self.ui.Login.setText("验证中…")
+        self.worker = VerifyWorker(uid, pwd)
+        self.worker.done.connect(self.on_verified)
+        self.worker.start()
+
+    def on_verified(self, ok, err):
+        uid = self.worker.uid
+        self.worker.wait()
+        self.worker = None
+        self.ui.Login.setEnabled(True)
+        self.ui.Login.setText(self._login_text)
+        if ok:
             self.user = uid
             self.accept()
+        elif err:
+            QMessageBox.warning(self, "登录失败", f"无法完成验证：{err}")
         else:
             QMessageBox.warning(self, "登录失败", "工号或密码错误")
 
@@ -35,17 +124,13 @@ class LoginDialog(QDialog):
         ResetPwdDialog(self).exec()
 
 
-class ChangePwdDialog(QDialog):
+class ChangePwdDialog(_SavePwdDialog):
     """
     修改密码对话框。无需输入旧密码，只需输入验证码（i love sau）
     以及两次新密码。
     """
     def __init__(self, parent=None):
-        super().__init__(parent)
-        self.ui = UiChange()
-        self.ui.setupUi(self)
-        self.ui.Confirm_password_change.clicked.connect(self.on_ok)
-        self.ui.Return_to_the_login_page.clicked.connect(self.reject)
+        super().__init__(UiChange(), "Confirm_password_change", parent)
 
     def on_ok(self):
         uid    = self.ui.EmployeeID.text().strip()
@@ -64,22 +149,16 @@ class ChangePwdDialog(QDialog):
             return
 
         # 更新用户密码
-        upsert_user(uid, new1)
-        QMessageBox.information(self, "成功", "密码已修改")
-        self.accept()
+        self._save(uid, new1, "密码已修改")
 
 
-class ResetPwdDialog(QDialog):
+class ResetPwdDialog(_SavePwdDialog):
     """
     找回密码对话框。只需输入工号 + 验证码（i love sau），
     会将该工号的密码重置为“i love sau”。
     """
     def __init__(self, parent=None):
-        super().__init__(parent)
-        self.ui = UiReset()
-        self.ui.setupUi(self)
-        self.ui.Confirm_password_recovery.clicked.connect(self.on_ok)
-        self.ui.Return_to_the_login_page.clicked.connect(self.reject)
+        super().__init__(UiReset(), "Confirm_password_recovery", parent)
 
     def on_ok(self):
         uid  = self.ui.EmployeeID.text().strip()
@@ -91,9 +170,4 @@ class ResetPwdDialog(QDialog):
             return
 
         # 重置密码为固定码
-        upsert_user(uid, FIXED_CODE)
-        QMessageBox.information(
-            self, "成功",
-            f"工号【{uid}】的密码已重置为“{FIXED_CODE}”"
-        )
-        self.accept()
+        self._save(uid, FIXED_CODE, f"工号【{uid}】的密码已重置为“{FIXED_CODE}”")
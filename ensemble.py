@@ -0,0 +1,227 @@
+# ensemble.py
+# 多个 MLP 组成的集成模型：K 个成员的参数按层堆叠成 (K, 输入, 输出) 数组，
+# 一次前向计算得到全部成员的预测，再给出均值和分位数区间。
+# 第一层（含标准化）对所有成员合并成一次矩阵乘法，之后各层用 einsum 批量计算。
+#
+#   python ensemble.py train --k 16          # 用 Train_model/mill.csv 自助采样训练 K 个成员
+#   python ensemble.py bench                 # 比较逐个成员预测与堆叠前向计算的耗时
+#
+# 参数保存为 wear_ensemble.npz（纯 NumPy 数组，与 scikit-learn 版本无关）。
+
+import sys
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from predictor import FEAT_COLS, load_model, build_features
+
+ENSEMBLE_FILE = "wear_ensemble.npz"
+TRAIN_FILE = "Train_model/mill.csv"
+BAND_PERCENTILES = (5, 95)
+
+_ACTIVATIONS = {
+    "relu":     lambda a: np.maximum(a, 0, out=a),
+    "tanh":     lambda a: np.tanh(a, out=a),
+    "logistic": lambda a: np.divide(1, 1 + np.exp(-a), out=a),
+    "identity": lambda a: a,
+}
+
+
+class StackedMLP:
+    """
+    K 个结构相同的 (StandardScaler + MLPRegressor) 的堆叠参数。
+    weights[i] 形状 (K, 输入, 输出)，biases[i] 形状 (K, 输出)；第一层已并入标准化。
+    """
+
+    def __init__(self, weights, biases, activation: str = "relu"):
+        if activation not in _ACTIVATIONS:
+            raise ValueError(f"不支持的激活函数：{activation}")
+        # float32 足够 VB 的精度，且内存带宽减半
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.activation = activation
+        k, f, h = self.weights[0].shape
+        self.k = k
+        # 第一层所有成员共享输入：(F, K*H) 一次矩阵乘法，结果按 (N, K, H) 排列无需转置
+        self._w0 = np.ascontiguousarray(self.weights[0].transpose(1, 0, 2).reshape(f, k * h))
+        self._b0 = self.biases[0].reshape(k * h)
+
+    @classmethod
+    def from_pipelines(cls, pipelines):
+        """由若干 sklearn Pipeline(scaler, mlp) 构造；各成员的层结构必须相同"""
+        scalers = [p.named_steps["scaler"] for p in pipelines]
+        mlps = [p.named_steps["mlp"] for p in pipelines]
+        shapes = {tuple(c.shape for c in m.coefs_) for m in mlps}
+        if len(shapes) != 1:
+            raise ValueError("集成成员的网络结构不一致，无法堆叠")
+        if len({m.activation for m in mlps}) != 1 or mlps[0].out_activation_ != "identity":
+            raise ValueError("集成成员的激活函数不一致")
+        if mlps[0].coefs_[-1].shape[1] != 1:
+            raise ValueError("集成成员必须是单输出回归模型")
+        weights = [np.stack([m.coefs_[i] for m in mlps]) for i in range(len(mlps[0].coefs_))]
+        biases = [np.stack([m.intercepts_[i] for m in mlps]) for i in range(len(mlps[0].intercepts_))]
+        # 把标准化并入第一层：((x - μ) / σ) W + b = x (W / σ) + (b - (μ / σ) W)
+        mean = np.stack([s.mean_ for s in scalers])
+        scale = np.stack([s.scale_ for s in scalers])
+        biases[0] = biases[0] - np.einsum("kf,kfh->kh", mean / scale, weights[0])
+        weights[0] = weights[0] / scale[:, :, None]
+        return cls(weights, biases, mlps[0].activation)
+
+    @classmethod
+    def load(cls, path: str = ENSEMBLE_FILE):
+        with np.load(path) as data:
+            n = int(data["layers"])
+            return cls([data[f"W{i}"] for i in range(n)], [data[f"b{i}"] for i in range(n)],
+                       str(data["activation"]))
+
+    def save(self, path: str = ENSEMBLE_FILE):
+        arrays = {f"W{i}": w for i, w in enumerate(self.weights)}
+        arrays.update({f"b{i}": b for i, b in enumerate(self.biases)})
+        np.savez_compressed(path, layers=len(self.weights), activation=self.activation, **arrays)
+
+    def predict_all(self, X) -> np.ndarray:
+        """全部成员的预测，形状 (N, K)"""
+        X = np.asarray(X, dtype=np.float32)
+        act = _ACTIVATIONS[self.activation]
+        n = len(X)
+        a = X @ self._w0
+        a += self._b0
+        a = act(a).reshape(n, self.k, -1)                                  # (N, K, H)
+        for w, b in zip(self.weights[1:-1], self.biases[1:-1]):
+            a = act(np.einsum("nkh,kho->nko", a, w) + b)
+        y = np.einsum("nkh,kh->nk", a, self.weights[-1][:, :, 0])
+        y += self.biases[-1][:, 0]
+        return y
+
+    def predict(self, X, percentiles=BAND_PERCENTILES):
+        """返回 (均值, 下分位, 上分位)，各为长度 N 的 float64 数组"""
+        y = self.predict_all(X)
+        mean = y.mean(axis=1, dtype=np.float64)
+        if self.k == 1:
+            return mean, mean.copy(), mean.copy()
+        # 成员数很小，整行排序后线性插值（与 np.percentile 默认方法相同），比 np.percentile 快
+        y.sort(axis=1)
+        bands = []
+        for q in percentiles:
+            pos = q / 100 * (self.k - 1)
+            i = int(pos)
+            j = min(i + 1, self.k - 1)
+            bands.append(y[:, i] + (y[:, j] - y[:, i]) * (pos - i))
+        return (mean, *(b.astype(np.float64) for b in bands))
+
+
+_ensemble = None
+_ensemble_lock = threading.Lock()
+
+def load_ensemble() -> StackedMLP:
+    """加载并缓存集成模型；没有 wear_ensemble.npz 时退化为只含 wear_model.pkl 的单成员"""
+    global _ensemble
+    with _ensemble_lock:
+        if _ensemble is None:
+            try:
+                _ensemble = StackedMLP.load()
+            except FileNotFoundError:
+                _ensemble = StackedMLP.from_pipelines([load_model()])
+        return _ensemble
+
+
+def train(k: int, path: str = TRAIN_FILE, seed: int = 0):
+    """以 wear_model.pkl 的超参数，在自助采样的训练集上训练 k 个成员"""
+    import pandas as pd
+    from sklearn.base import clone
+
+    df = pd.read_csv(path).dropna(subset=["VB"])
+    X = build_features(df).to_numpy(dtype=np.float64)
+    y = df["VB"].to_numpy(dtype=np.float64)
+    base = load_model()
+    rnd = np.random.default_rng(seed)
+    members = []
+    for i in range(k):
+        idx = rnd.integers(0, len(X), len(X))
+        member = clone(base).set_params(mlp__random_state=seed + i)
+        members.append(member.fit(X[idx], y[idx]))
+    return StackedMLP.from_pipelines(members)
+
+
+# —— 性能测试 —— #
+def _synthetic(k: int):
+    """k 个与 wear_model.pkl 结构相同、权重加扰动的成员（只用于测速）"""
+    import copy
+
+    base = load_model()
+    rnd = np.random.default_rng(0)
+    members = []
+    for _ in range(k):
+        m = copy.deepcopy(base)
+        mlp = m.named_steps["mlp"]
+        mlp.coefs_ = [c + rnd.normal(0, 0.05, c.shape) for c in mlp.coefs_]
+        members.append(m)
+    return members
+
+
+def _bench(args):
+    import warnings
+    import pandas as pd
+    warnings.filterwarnings("ignore")
+
+    def best(fn, repeat=args.repeat):
+        fn()
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+        return min(times) * 1000
+
+    rnd = np.random.default_rng(1)
+    print(f"每项取 {args.repeat} 次中的最短时间；倍数为相对 K=1 的堆叠前向耗时")
+    for rows in args.rows:
+        df = pd.DataFrame(rnd.normal(0.3, 0.2, (rows, len(FEAT_COLS))), columns=FEAT_COLS)
+        df["material"] = rnd.integers(1, 3, rows)
+        X = build_features(df)
+        Xa = X.to_numpy(dtype=np.float32)
+        print(f"\n{rows} 行")
+        print(f"{'K':>4} {'逐个 predict':>14} {'堆叠前向+分位数':>16} {'倍数':>7} {'每个成员':>10}")
+        base = None
+        for k in args.k:
+            members = _synthetic(k)
+            stacked = StackedMLP.from_pipelines(members)
+            t_loop = best(lambda: [m.predict(X) for m in members])
+            t_stack = best(lambda: stacked.predict(Xa))
+            base = base or t_stack
+            print(f"{k:>4} {t_loop:>11.3f} ms {t_stack:>13.3f} ms {t_stack / base:>6.1f}× "
+                  f"{t_stack / k * 1000:>7.1f} µs")
+    # 堆叠结果与逐个预测一致（float32 误差）
+    members = _synthetic(8)
+    ref = np.stack([m.predict(X) for m in members], axis=1)
+    err = np.abs(StackedMLP.from_pipelines(members).predict_all(Xa) - ref).max()
+    print(f"\n与逐个 predict 的最大误差 {err:.2e}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="磨损预测集成模型")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    tp = sub.add_parser("train", help="自助采样训练 K 个成员并保存")
+    tp.add_argument("--k", type=int, default=16)
+    tp.add_argument("--data", default=TRAIN_FILE)
+    tp.add_argument("--seed", type=int, default=0)
+    tp.add_argument("-o", "--output", default=ENSEMBLE_FILE)
+    bp = sub.add_parser("bench", help="比较逐个成员预测与堆叠前向计算的耗时")
+    bp.add_argument("--rows", type=int, nargs="*", default=[16, 1000, 10_000])
+    bp.add_argument("--k", type=int, nargs="*", default=[1, 2, 4, 8, 16, 32, 64])
+    bp.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "bench":
+        _bench(args)
+        return
+    t0 = time.perf_counter()
+    model = train(args.k, args.data, args.seed)
+    model.save(args.output)
+    print(f"{model.k} 个成员，用时 {time.perf_counter() - t0:.1f} s，已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+# feature_extraction.py
+# 从原始高采样率振动/声发射/电流波形中流式提取特征，
+# 输出与 testing_mill.csv 完全相同的列布局，可直接交给 PredictWorker 预测。
+#
+#   python feature_extraction.py run_*.bin -o features.csv --fs 250000 --case 1 \
+#          --doc 1.5 --feed 0.5 --material 1 --stat rms
+#
+# 原始文件为按采样点交错存储的多通道二进制（默认 6 通道 float32 小端，
+# 通道顺序同 CHANNELS），按块内存映射读取，内存占用与文件大小无关。
+
+import os
+import sys
+import csv
+import time
+import argparse
+
+import numpy as np
+
+CHANNELS = ("smcAC", "smcDC", "vib_table", "vib_spindle", "AE_table", "AE_spindle")
+CSV_HEADER = ["", "case", "run", "time", "DOC", "feed", "material", *CHANNELS]
+STATS = ("rms", "peak", "wrms_max", "band")
+
+
+def open_waveform(path, n_channels: int = len(CHANNELS), dtype: str = "<f4", offset: int = 0):
+    """以内存映射方式打开原始波形文件，返回形状为 (采样点数, 通道数) 的只读数组"""
+    mm = np.memmap(path, dtype=dtype, mode="r", offset=offset)
+    n = len(mm) // n_channels
+    return mm[:n * n_channels].reshape(n, n_channels)
+
+
+def bandpass_taps(lo: float, hi: float, fs: float, n_taps: int = 129) -> np.ndarray:
+    """加汉明窗的 sinc 带通 FIR 系数"""
+    t = np.arange(n_taps) - (n_taps - 1) / 2
+    h = (2 * hi / fs) * np.sinc(2 * hi / fs * t) - (2 * lo / fs) * np.sinc(2 * lo / fs * t)
+    return (h * np.hamming(n_taps)).astype(np.float32)
+
+
+class OverlapSaveFilter:
+    """
+    多通道 FFT 重叠保留法 FIR 滤波。输入缓冲区预先分配，
+    每块只做一次 rfft/irfft（沿采样轴对所有通道同时计算）。
+    """
+
+    def __init__(self, taps: np.ndarray, block: int, n_channels: int):
+        self.m = len(taps)
+        self.block = block
+        self.nfft = 1 << int(np.ceil(np.log2(block + self.m - 1)))
+        self.H = np.fft.rfft(taps, self.nfft)[:, None]
+        self.buf = np.zeros((self.nfft, n_channels), dtype=np.float32)
+
+    def reset(self):
+        self.buf.fill(0)
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        """x 形状 (n, 通道数)，n <= block；返回同形状的滤波结果"""
+        m, n = self.m, len(x)
+        buf = self.buf
+        buf[m - 1:m - 1 + n] = x
+        buf[m - 1 + n:] = 0
+        y = np.fft.irfft(np.fft.rfft(buf, axis=0) * self.H, self.nfft, axis=0)[m - 1:m - 1 + n]
+        # 保留最后 m-1 个输入样本作为下一块的历史
+        buf[:m - 1] = buf[n:n + m - 1]
+        return y
+
+
+class RunFeatureAccumulator:
+    """
+    逐块累积一次走刀（run）的特征：整体 RMS、峰值、窗口 RMS 最大值、
+    以及带通滤波后的 RMS。所有累加器按通道向量化，块之间只保留常数大小的状态。
+    """
+
+    def __init__(self, n_channels: int, window: int = 1024,
+                 band_filter: OverlapSaveFilter = None):
+        self.window = window
+        self.band_filter = band_filter
+        self.carry = np.zeros((window, n_channels), dtype=np.float64)
+        self.sumsq = np.zeros(n_channels, dtype=np.float64)
+        self.band_sumsq = np.zeros(n_channels, dtype=np.float64)
+        self.peak = np.zeros(n_channels, dtype=np.float64)
+        self.wrms_max = np.zeros(n_channels, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.n_carry = 0
+        self.sumsq.fill(0)
+        self.band_sumsq.fill(0)
+        self.peak.fill(0)
+        self.wrms_max.fill(0)
+        if self.band_filter is not None:
+            self.band_filter.reset()
+
+    def feed(self, x: np.ndarray):
+        sq = np.square(x, dtype=np.float64)
+        self.sumsq += sq.sum(axis=0)
+        np.maximum(self.peak, np.abs(x).max(axis=0), out=self.peak)
+        self.n += len(x)
+
+        # 窗口 RMS：先补满上一块遗留的不完整窗口，其余按整窗 reshape 计算
+        w, i = self.window, 0
+        if self.n_carry:
+            i = min(w - self.n_carry, len(sq))
+            self.carry[self.n_carry:self.n_carry + i] = sq[:i]
+            self.n_carry += i
+            if self.n_carry == w:
+                np.maximum(self.wrms_max, np.sqrt(self.carry.mean(axis=0)), out=self.wrms_max)
+                self.n_carry = 0
+        full = (len(sq) - i) // w
+        if full:
+            win = np.sqrt(sq[i:i + full * w].reshape(full, w, -1).mean(axis=1))
+            np.maximum(self.wrms_max, win.max(axis=0), out=self.wrms_max)
+        rest = sq[i + full * w:]
+        if len(rest):
+            self.carry[:len(rest)] = rest
+            self.n_carry = len(rest)
+
+        if self.band_filter is not None:
+            self.band_sumsq += np.square(self.band_filter.process(x), dtype=np.float64).sum(axis=0)
+
+    def result(self) -> dict:
+        n = max(self.n, 1)
+        return {
+            "rms":      np.sqrt(self.sumsq / n),
+            "peak":     self.peak.copy(),
+            "wrms_max": self.wrms_max.copy(),
+            "band":     np.sqrt(self.band_sumsq / n),
+        }
+
+
+def extract_runs(wave: np.ndarray, run_samples: int = None, block: int = 65536,
+                 window: int = 1024, band=None, fs: float = None, keep_tail: bool = False):
+    """
+    按块遍历波形 wave（形状 (采样点数, 通道数)），每 run_samples 个采样点
+    视为一次走刀（None 表示整个文件为一次走刀），逐次产出特征字典。
+    末尾不足 run_samples 的采样点默认丢弃（个数见 tail_samples），keep_tail=True 时作为最后一次走刀。
+    band=(lo, hi) 时计算带通 RMS，需要同时给出采样率 fs。
+    """
+    n_total, n_channels = wave.shape
+    if n_total == 0:
+        return
+    run_samples = run_samples or n_total
+    band_filter = None
+    if band:
+        band_filter = OverlapSaveFilter(bandpass_taps(band[0], band[1], fs), block, n_channels)
+    acc = RunFeatureAccumulator(n_channels, window, band_filter)
+    stage = np.empty((block, n_channels), dtype=np.float32)
+
+    starts = range(0, n_total - run_samples + 1, run_samples)
+    if keep_tail and tail_samples(n_total, run_samples):
+        starts = range(0, n_total, run_samples)
+    for start in starts:
+        acc.reset()
+        end = min(start + run_samples, n_total)
+        for i in range(start, end, block):
+            n = min(block, end - i)
+            np.copyto(stage[:n], wave[i:i + n])
+            acc.feed(stage[:n])
+        yield acc.result()
+
+
+def tail_samples(n_total: int, run_samples: int = None) -> int:
+    """extract_runs 默认丢弃的末尾采样点数"""
+    return n_total % run_samples if run_samples else 0
+
+
+def _next_row_index(path, tail: int = 4096) -> int:
+    """读取文件末尾，返回最后一个 row_N 行号 + 1（只有表头时为 0）"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(f.tell() - tail, 0))
+        lines = f.read().decode("utf-8-sig", errors="ignore").splitlines()
+    for line in reversed(lines):
+        label = line.split(",", 1)[0]
+        if label.startswith("row_") and label[4:].isdigit():
+            return int(label[4:]) + 1
+    return 0
+
+
+class FeatureCsvWriter:
+    """按 testing_mill.csv 的格式（UTF-8 BOM + 未命名行号列）逐行写出特征"""
+
+    def __init__(self, path, append: bool = False):
+        # 追加到已有文件时不能再写 BOM 和表头，行号接着文件最后一行
+        append = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.row = _next_row_index(path) if append else 0
+        self.f = open(path, "a" if append else "w",
+                      encoding="utf-8" if append else "utf-8-sig", newline="")
+        self.w = csv.writer(self.f)
+        if not append:
+            self.w.writerow(CSV_HEADER)
+
+    def write(self, case, run, t, doc, feed, material, values):
+        self.w.writerow([f"row_{self.row}", case, run, t, doc, feed, material,
+                         *(f"{v:.9g}" for v in values)])
+        self.row += 1
+
+    def close(self):
+        self.f.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="原始波形流式特征提取，输出 testing_mill.csv 格式")
+    ap.add_argument("files", nargs="+", help="原始波形文件（交错多通道二进制）")
+    ap.add_argument("-o", "--output", required=True)
+    ap.add_argument("--append", action="store_true", help="追加到已有 CSV")
+    ap.add_argument("--dtype", default="<f4")
+    ap.add_argument("--channels", type=int, default=len(CHANNELS))
+    ap.add_argument("--offset", type=int, default=0, help="文件头字节数")
+    ap.add_argument("--fs", type=float, required=True,
+                    help="每通道采样率 (Hz)，须与采集设置一致（带通 RMS 依赖它）")
+    ap.add_argument("--run-samples", type=int, help="每次走刀的采样点数；缺省为每个文件一次走刀")
+    ap.add_argument("--keep-tail", action="store_true",
+                    help="文件末尾不足一次走刀的采样点也输出一行（默认丢弃并提示）")
+    ap.add_argument("--block", type=int, default=65536)
+    ap.add_argument("--window", type=int, default=1024)
+    ap.add_argument("--stat", choices=STATS, default="rms",
+                    help="写入 CSV 的特征；须与训练模型时离线脚本的口径一致")
+    ap.add_argument("--band", nargs=2, type=float, metavar=("LO", "HI"),
+                    help="带通频段 (Hz)，--stat band 时必填")
+    ap.add_argument("--case", type=int, default=1)
+    ap.add_argument("--doc", type=float, default=1.5)
+    ap.add_argument("--feed", type=float, default=0.5)
+    ap.add_argument("--material", type=int, default=1)
+    ap.add_argument("--first-run", type=int, default=1)
+    ap.add_argument("--time-step", type=float, default=2.0, help="time 列 = 走刀序号 × 步长")
+    args = ap.parse_args(argv)
+    if args.stat == "band" and not args.band:
+        ap.error("--stat band 需要同时指定 --band LO HI")
+    if args.channels != len(CHANNELS):
+        ap.error(f"CSV 需要 {len(CHANNELS)} 个通道：{', '.join(CHANNELS)}")
+
+    out = FeatureCsvWriter(args.output, args.append)
+    run, samples, dropped, t0 = args.first_run, 0, 0, time.perf_counter()
+    try:
+        for path in args.files:
+            wave = open_waveform(path, args.channels, args.dtype, args.offset)
+            samples += len(wave)
+            tail = 0 if args.keep_tail else tail_samples(len(wave), args.run_samples)
+            if tail:
+                dropped += tail
+                print(f"[提示] {path} 末尾 {tail} 个采样点不足一次走刀（{args.run_samples}），已丢弃",
+                      file=sys.stderr)
+            for feats in extract_runs(wave, args.run_samples, args.block, args.window,
+                                      args.band, args.fs, args.keep_tail):
+                out.write(args.case, run, run * args.time_step, args.doc, args.feed,
+                          args.material, feats[args.stat])
+                run += 1
+    finally:
+        out.close()
+    elapsed = time.perf_counter() - t0
+    rate = samples / elapsed if elapsed else float("inf")
+    if dropped:
+        print(f"共丢弃 {dropped} 个末尾采样点；需要保留时加 --keep-tail")
+    print(f"{run - args.first_run} 次走刀，{samples} 个采样点，{elapsed:.2f} s，"
+          f"{rate / 1e6:.1f} M 采样点/秒/通道（实时采样率的 {rate / args.fs:.0f} 倍）")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
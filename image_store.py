@@ -0,0 +1,249 @@
+# image_store.py
+# 内容寻址图片库：图片按内容的 SHA-256 存放，同一张图片无论被多少把刀具引用都只存一份。
+# 刀具表通过 图片哈希 字段引用图片；界面显示时使用按长边预先缩小的副本（variants）。
+#
+#   python image_store.py migrate              # 把旧的 刀具图片路径 导入图片库并填写 图片哈希
+#   python image_store.py ingest drill_tools DR880-20-5D render.jpg
+#   python image_store.py variants             # 预先生成所有缩小副本
+#   python image_store.py check [--deep]       # 查找引用了不存在图片的刀具（--deep 同时校验内容哈希）
+#   python image_store.py gc [--dry-run]       # 删除不再被任何刀具引用的图片
+#
+# 目录结构：image_store/objects/ab/abcdef…（原图）、image_store/variants/512/ab/abcdef….png
+
+import os
+import sys
+import time
+import hashlib
+import argparse
+
+from PySide6.QtCore import Qt
+from PySide6.QtGui  import QImage, QImageReader
+
+from db import ROOT, DDL_MAP, get_conn, init_all_tables
+
+STORE_DIR = ROOT / "image_store"
+VARIANT_SIZES = (256, 512, 1024)       # 缩小副本的长边像素
+GC_GRACE_SECONDS = 3600                # 新写入但尚未登记的文件在此时间内不回收
+
+
+def object_path(digest: str):
+    return STORE_DIR / "objects" / digest[:2] / digest
+
+
+def variant_path(digest: str, size: int):
+    return STORE_DIR / "variants" / str(size) / digest[:2] / f"{digest}.png"
+
+
+def _write_atomic(path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def ingest(conn, src_path) -> str:
+    """把图片文件存入图片库（已存在则跳过复制），登记到 images 表并返回哈希（不提交）"""
+    with open(src_path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    dest = object_path(digest)
+    if not dest.exists():
+        _write_atomic(dest, data)
+    else:
+        # 已有的对象可能早已无人引用：刷新修改时间，让 gc 的宽限期从这次入库重新计算，
+        # 避免在调用方写入 图片哈希 之前被回收
+        os.utime(dest)
+    reader = QImageReader(str(dest))
+    size = reader.size()
+    fmt = bytes(reader.format()).decode() or None
+    conn.execute("""
+        INSERT OR IGNORE INTO images(哈希, 大小, 格式, 宽, 高) VALUES(?, ?, ?, ?, ?)
+    """, (digest, len(data), fmt, size.width() if size.isValid() else None,
+          size.height() if size.isValid() else None))
+    return digest
+
+
+def resolve(digest: str, longest: int = None):
+    """
+    返回用于显示的图片文件路径：longest 给出时返回不小于该长边的最小缩小副本
+    （首次请求时生成并缓存），否则返回原图。图片不存在时返回 None。
+    """
+    if not digest:
+        return None
+    src = object_path(digest)
+    if not src.exists():
+        return None
+    if longest is None:
+        return src
+    size = next((s for s in VARIANT_SIZES if s >= longest), None)
+    if size is None:
+        return src
+    path = variant_path(digest, size)
+    if path.exists() or make_variant(digest, size):
+        return path
+    return src
+
+
+def make_variant(digest: str, size: int) -> bool:
+    """生成长边为 size 的缩小副本；原图本身不大于 size 时不生成，返回 False"""
+    img = QImage(str(object_path(digest)))
+    if img.isNull() or max(img.width(), img.height()) <= size:
+        return False
+    small = img.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    path = variant_path(digest, size)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.tmp.png")
+    if not small.save(str(tmp), "PNG"):
+        return False
+    os.replace(tmp, path)
+    return True
+
+
+def referenced(conn) -> set:
+    """所有刀具表中引用的图片哈希"""
+    union = " UNION ".join(f"SELECT 图片哈希 FROM {t} WHERE 图片哈希 IS NOT NULL" for t in DDL_MAP)
+    return {r[0] for r in conn.execute(union)}
+
+
+def _stored_objects() -> set:
+    root = STORE_DIR / "objects"
+    if not root.is_dir():
+        return set()
+    found = set()
+    with os.scandir(root) as shards:
+        for shard in shards:
+            if shard.is_dir():
+                with os.scandir(shard.path) as it:
+                    found.update(e.name for e in it if e.is_file() and not e.name.startswith("."))
+    return found
+
+
+def migrate(conn, base=None):
+    """
+    把 刀具图片路径 指向的旧图片导入图片库并填写 图片哈希。同一路径只读一次；
+    返回 (导入的引用数, 去重后的图片数, 找不到文件的路径列表)。
+    """
+    if base is None:
+        base = getattr(sys, "_MEIPASS", ROOT)
+    cache, missing, n_refs = {}, [], 0
+    for table in DDL_MAP:
+        cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+        if "刀具图片路径" not in cols:
+            continue
+        rows = conn.execute(f"""
+            SELECT rowid, 刀具图片路径 FROM {table}
+             WHERE 图片哈希 IS NULL AND COALESCE(刀具图片路径, '') <> ''
+        """).fetchall()
+        for rowid, rel in rows:
+            if rel not in cache:
+                path = os.path.join(base, rel)
+                cache[rel] = ingest(conn, path) if os.path.isfile(path) else None
+                if cache[rel] is None:
+                    missing.append(rel)
+            if cache[rel]:
+                conn.execute(f"UPDATE {table} SET 图片哈希=? WHERE rowid=?", (cache[rel], rowid))
+                n_refs += 1
+    return n_refs, len({h for h in cache.values() if h}), missing
+
+
+def check(conn, deep: bool = False):
+    """
+    完整性检查，返回 (缺失图片的引用 [(表, 刀具编号, 哈希)], 内容损坏的哈希列表)。
+    默认只比对文件名集合（一次目录遍历）；deep=True 时重新计算每个文件的哈希。
+    """
+    stored = _stored_objects()
+    broken = []
+    for table in DDL_MAP:
+        for tool, digest in conn.execute(
+                f"SELECT 刀具编号, 图片哈希 FROM {table} WHERE 图片哈希 IS NOT NULL"):
+            if digest not in stored:
+                broken.append((table, tool, digest))
+    corrupt = []
+    if deep:
+        for digest in stored:
+            h = hashlib.sha256()
+            with open(object_path(digest), "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            if h.hexdigest() != digest:
+                corrupt.append(digest)
+    return broken, corrupt
+
+
+def gc(conn, dry_run: bool = False):
+    """删除未被任何刀具引用的图片（及其缩小副本），返回删除的哈希列表（不提交）"""
+    keep = referenced(conn)
+    now = time.time()
+    garbage = []
+    for digest in _stored_objects() - keep:
+        path = object_path(digest)
+        # 刚入库、还没来得及写入刀具表的图片暂不回收
+        if now - path.stat().st_mtime < GC_GRACE_SECONDS:
+            continue
+        garbage.append(digest)
+        if not dry_run:
+            path.unlink()
+            for size in VARIANT_SIZES:
+                variant_path(digest, size).unlink(missing_ok=True)
+    if not dry_run:
+        # 未被引用且文件已不存在的登记一并清理
+        stale = [(r[0],) for r in conn.execute("SELECT 哈希 FROM images")
+                 if r[0] not in keep and not object_path(r[0]).exists()]
+        conn.executemany("DELETE FROM images WHERE 哈希=?", stale)
+    return garbage
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="刀具图片库")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    mp = sub.add_parser("migrate", help="导入 刀具图片路径 指向的旧图片")
+    mp.add_argument("--base", help="旧图片相对路径的根目录（默认程序目录）")
+    ip = sub.add_parser("ingest", help="为一把刀具设置图片")
+    ip.add_argument("table", choices=list(DDL_MAP))
+    ip.add_argument("tool_id")
+    ip.add_argument("image")
+    sub.add_parser("variants", help="预先生成所有缩小副本")
+    cp = sub.add_parser("check", help="检查图片引用")
+    cp.add_argument("--deep", action="store_true", help="同时校验文件内容哈希")
+    gp = sub.add_parser("gc", help="回收未被引用的图片")
+    gp.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+
+    init_all_tables()
+    with get_conn() as conn:
+        if args.cmd == "migrate":
+            n_refs, n_images, missing = migrate(conn, args.base)
+            conn.commit()
+            print(f"{n_refs} 条引用指向 {n_images} 张不同图片")
+            for rel in missing:
+                print(f"[缺失] {rel}")
+        elif args.cmd == "ingest":
+            digest = ingest(conn, args.image)
+            cur = conn.execute(f"UPDATE {args.table} SET 图片哈希=? WHERE 刀具编号=?",
+                               (digest, args.tool_id))
+            conn.commit()
+            print(f"{digest}（更新 {cur.rowcount} 行）")
+        elif args.cmd == "variants":
+            n = 0
+            for digest in referenced(conn) & _stored_objects():
+                for size in VARIANT_SIZES:
+                    if not variant_path(digest, size).exists():
+                        n += make_variant(digest, size)
+            print(f"生成 {n} 个缩小副本")
+        elif args.cmd == "check":
+            broken, corrupt = check(conn, args.deep)
+            for table, tool, digest in broken:
+                print(f"[缺失] {table} {tool} -> {digest}")
+            for digest in corrupt:
+                print(f"[损坏] {digest}")
+            print(f"{len(broken)} 个引用缺失图片，{len(corrupt)} 张图片内容损坏")
+            return 1 if broken or corrupt else 0
+        else:
+            garbage = gc(conn, args.dry_run)
+            conn.commit()
+            print(f"{'可回收' if args.dry_run else '已回收'} {len(garbage)} 张图片")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
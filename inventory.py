@@ -0,0 +1,131 @@
+# inventory.py
+# 库存汇总（inventory_rollup）维护工具。汇总表由刀具表上的触发器增量维护，
+# 可视化界面的饼图和统计视图只读汇总表。
+#
+#   python inventory.py check            # 与刀具表全量统计比对
+#   python inventory.py rebuild          # 全量重算（例如用旧版程序修改过数据库后）
+#   python inventory.py bench --tools 200000
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+from db import (
+    DDL_MAP, COND_COL, ROLLUP_DIMS, ROLLUP_DDL, get_conn, init_all_tables,
+    rollup_triggers, rebuild_rollups
+)
+
+
+def full_scan(conn, dimension: str, table: str):
+    """不经汇总表、直接扫描刀具表的统计结果 {(取值, 状况): 数量}"""
+    expr = ROLLUP_DIMS[dimension].format(r=table)
+    return dict(((v, c), n) for v, c, n in conn.execute(
+        f"SELECT {expr}, COALESCE({COND_COL[table]}, ''), COUNT(*) FROM {table} GROUP BY 1, 2"))
+
+
+def check(conn, tables=None):
+    """比对汇总表与全量统计，返回不一致项 [(表, 维度, 取值, 状况, 汇总值, 实际值)]"""
+    diffs = []
+    for table in tables or DDL_MAP:
+        for dim in ROLLUP_DIMS:
+            actual = full_scan(conn, dim, table)
+            stored = dict(((v, c), n) for v, c, n in conn.execute(
+                "SELECT 取值, 状况, 数量 FROM inventory_rollup WHERE 刀具表=? AND 维度=? AND 数量<>0",
+                (table, dim)))
+            for key in actual.keys() | stored.keys():
+                if actual.get(key, 0) != stored.get(key, 0):
+                    diffs.append((table, dim, *key, stored.get(key, 0), actual.get(key, 0)))
+    return diffs
+
+
+# —— 性能测试 —— #
+def _bench(args):
+    from backend import inventory_rollup, condition_counts
+
+    tmp = tempfile.mkdtemp(prefix="rollup-bench-")
+    path = os.path.join(tmp, "rollup.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("".join(DDL_MAP.values()) + ROLLUP_DDL)
+    rnd = random.Random(1)
+
+    def rows(n, start=0):
+        for i in range(start, start + n):
+            yield (f"B{i:07d}", "X", f"S{rnd.randrange(30)}", rnd.choice(("硬质合金", "高速钢", "PCD")),
+                   f"A{rnd.randrange(40)}-{rnd.randrange(10)}", rnd.choice(("在库", "借出", "报废")),
+                   rnd.choice(("新", "良好", "差")), rnd.randrange(300))
+
+    insert = ("INSERT INTO drill_tools(刀具编号, 刀具型号, 生产商, 刀具材料, 库存位置, 库存状态, "
+              "刀具状况, 使用次数) VALUES(?, ?, ?, ?, ?, ?, ?, ?)")
+    n = args.tools
+    t0 = time.perf_counter()
+    conn.executemany(insert, rows(n))
+    conn.commit()
+    t_plain = time.perf_counter() - t0
+    conn.executescript(rollup_triggers("drill_tools"))
+    t0 = time.perf_counter()
+    conn.executemany(insert, rows(n, n))
+    conn.commit()
+    t_trig = time.perf_counter() - t0
+    print(f"插入 {n} 行：无触发器 {t_plain:.2f} s，有触发器 {t_trig:.2f} s")
+    rebuild_rollups(conn)
+    conn.commit()
+    t0 = time.perf_counter()
+    for _ in range(1000):
+        conn.execute("UPDATE drill_tools SET 刀具状况=? WHERE 刀具编号=?",
+                     (rnd.choice(("新", "良好", "差")), f"B{rnd.randrange(2 * n):07d}"))
+        conn.commit()
+    print(f"单行修改并提交（含触发器）：{(time.perf_counter() - t0) / 1000 * 1000:.3f} ms/次")
+
+    def timed(label, fn, repeat=20):
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        print(f"{label:<28} {(time.perf_counter() - t0) / repeat * 1000:8.2f} ms")
+
+    print(f"{2 * n} 把刀具：")
+    timed("饼图（汇总表）", lambda: condition_counts(conn, "drill_tools"))
+    timed("按生产商（汇总表）", lambda: inventory_rollup(conn, "生产商", "drill_tools"))
+    timed("库位×状况（汇总表）", lambda: inventory_rollup(conn, "库存位置"))
+    timed("对照：按生产商全表扫描", lambda: full_scan(conn, "生产商", "drill_tools"))
+    timed("对照：库位×状况全表扫描", lambda: full_scan(conn, "库存位置", "drill_tools"))
+    print(f"汇总表一致性：{'一致' if not check(conn, ['drill_tools']) else '不一致'}")
+    conn.close()
+    for name in os.listdir(tmp):
+        os.remove(os.path.join(tmp, name))
+    os.rmdir(tmp)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="库存汇总表维护")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("check", help="与刀具表全量统计比对")
+    sub.add_parser("rebuild", help="全量重算汇总表")
+    bp = sub.add_parser("bench", help="在临时库上比较汇总表与全表扫描")
+    bp.add_argument("--tools", type=int, default=100_000, help="每轮插入的刀具数（共两轮）")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "bench":
+        _bench(args)
+        return
+    init_all_tables()
+    with get_conn() as conn:
+        if args.cmd == "rebuild":
+            rebuild_rollups(conn)
+            conn.commit()
+            print("已重算库存汇总")
+        else:
+            diffs = check(conn)
+            for table, dim, value, cond, stored, actual in diffs:
+                print(f"[不一致] {table} {dim}={value or '（空）'} 状况={cond or '（空）'}："
+                      f"汇总 {stored}，实际 {actual}")
+            print("库存汇总与刀具表一致" if not diffs else f"{len(diffs)} 项不一致，可运行 rebuild")
+            return 1 if diffs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
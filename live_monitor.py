@@ -0,0 +1,170 @@
+# live_monitor.py
+# 实时监测：从本地套接字、命名管道或持续增长的 CSV 文件读取特征行，
+# 按小批量调用磨损模型预测，图表用定长环形缓冲区刷新，超过阈值时报警。
+#
+# 数据源写法：
+#   tcp://127.0.0.1:9009    连接 replay_stream.py 或采集程序提供的 TCP 流
+#   /path/to/features.csv   跟踪（tail -f）一个不断追加的 CSV 文件或命名管道
+# 数据流第一行为 CSV 表头（与 testing_mill.csv 相同），之后每行一条特征记录。
+
+import csv
+import time
+import socket
+from collections import deque
+
+import pandas as pd
+
+from PySide6.QtCore   import Qt, QThread, Signal, QPointF
+from PySide6.QtGui    import QPainter, QColor, QPen
+from PySide6.QtCharts import QChart, QLineSeries, QValueAxis
+
+from predictor import build_features, FEAT_COLS
+from ensemble  import load_ensemble
+
+IDLE_TIMEOUT = 0.2      # 无数据时的轮询间隔（秒），也是响应“停止”的最长延迟
+
+
+def _tcp_lines(host: str, port: int, stopped):
+    """逐行读取 TCP 流；暂时没有数据时产出 None"""
+    with socket.create_connection((host, port), timeout=5) as sock:
+        sock.settimeout(IDLE_TIMEOUT)
+        buf = b""
+        while not stopped():
+            try:
+                chunk = sock.recv(65536)
+            except socket.timeout:
+                yield None
+                continue
+            if not chunk:
+                break
+            buf += chunk
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                yield line.decode("utf-8")
+
+
+def _tail_lines(path: str, stopped):
+    """从头读取文件并持续跟踪新追加的行（也适用于命名管道）；没有新行时产出 None"""
+    with open(path, encoding="utf-8", newline="") as f:
+        partial = ""
+        while not stopped():
+            line = f.readline()
+            if not line:
+                yield None
+                time.sleep(IDLE_TIMEOUT)
+                continue
+            partial += line
+            if partial.endswith("\n"):
+                yield partial
+                partial = ""
+
+
+class LiveMonitorWorker(QThread):
+    """
+    读取线程：解析特征行，凑满 batch_size 行或等待超过 max_wait 秒后
+    作为一个小批量送入模型，发射 (x 列表, 预测 VB 列表)。
+    """
+    batch  = Signal(list, list)
+    failed = Signal(str)
+
+    def __init__(self, source: str, batch_size: int = 16, max_wait: float = 0.5):
+        super().__init__()
+        self.source = source
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.n_rows = 0
+        self._stop = False
+
+    def stop(self):
+        self._stop = True
+
+    def _lines(self):
+        stopped = lambda: self._stop
+        if self.source.startswith("tcp://"):
+            host, _, port = self.source[len("tcp://"):].rpartition(":")
+            return _tcp_lines(host or "127.0.0.1", int(port), stopped)
+        return _tail_lines(self.source, stopped)
+
+    def run(self):
+        try:
+            model = load_ensemble()
+            header, rows, last = None, [], time.monotonic()
+            for line in self._lines():
+                if line is not None and line.strip():
+                    fields = next(csv.reader([line.lstrip("\ufeff")]))
+                    if header is None:
+                        header = fields
+                        missing = set(FEAT_COLS + ["material"]) - set(header)
+                        if missing:
+                            raise ValueError(f"数据流缺少特征列：{', '.join(sorted(missing))}")
+                    else:
+                        rows.append(fields)
+                if rows and (len(rows) >= self.batch_size
+                             or time.monotonic() - last >= self.max_wait):
+                    self._predict(model, header, rows)
+                    rows, last = [], time.monotonic()
+            if rows:
+                self._predict(model, header, rows)
+        except (OSError, ValueError) as e:
+            self.failed.emit(str(e))
+
+    def _predict(self, model, header, rows):
+        df = pd.DataFrame(rows, columns=header)
+        cols = FEAT_COLS + ["material"]
+        df[cols] = df[cols].apply(pd.to_numeric, errors="coerce")
+        df = df.dropna(subset=cols)
+        if df.empty:
+            return
+        df["material"] = df["material"].astype(int)
+        # 与磨损检测页面、监控文件夹一致，使用集成均值
+        y = model.predict(build_features(df).to_numpy(dtype="float32"))[0]
+        x = list(range(self.n_rows, self.n_rows + len(y)))
+        self.n_rows += len(y)
+        self.batch.emit(x, y.tolist())
+
+
+class LiveWearChart:
+    """
+    实时磨损曲线。点保存在定长 deque 中，每批数据只调用一次 QLineSeries.replace，
+    长时间运行时内存和重绘开销保持不变。
+    """
+
+    def __init__(self, view, threshold: float, capacity: int = 2000):
+        self.points = deque(maxlen=capacity)
+        self.threshold = threshold
+
+        self.chart = QChart()
+        self.series = QLineSeries(name="实时预测磨损")
+        self.series.setPen(QPen(QColor("#007acc"), 2))
+        self.limit = QLineSeries(name="报警阈值")
+        self.limit.setPen(QPen(QColor("#e74c3c"), 2, Qt.DashLine))
+        self.chart.addSeries(self.series)
+        self.chart.addSeries(self.limit)
+
+        self.axisX = QValueAxis()
+        self.axisX.setTitleText("样本序号")
+        self.axisX.setLabelFormat("%d")
+        self.axisY = QValueAxis()
+        self.axisY.setTitleText("磨损量 VB")
+        self.axisY.setLabelFormat("%.2f")
+        self.chart.addAxis(self.axisX, Qt.AlignBottom)
+        self.chart.addAxis(self.axisY, Qt.AlignLeft)
+        for s in (self.series, self.limit):
+            s.attachAxis(self.axisX)
+            s.attachAxis(self.axisY)
+        self.chart.setTitle("刀具磨损实时监测")
+        self.chart.legend().setAlignment(Qt.AlignRight)
+        self.axisX.setRange(0, 1)
+        self.axisY.setRange(0, threshold * 1.2)
+
+        view.setRenderHint(QPainter.Antialiasing)
+        view.setChart(self.chart)
+
+    def append(self, xs, ys):
+        self.points.extend(QPointF(float(x), float(y)) for x, y in zip(xs, ys))
+        self.series.replace(list(self.points))
+        x0, x1 = self.points[0].x(), self.points[-1].x()
+        self.limit.replace([QPointF(x0, self.threshold), QPointF(x1, self.threshold)])
+        y_max = max(max(p.y() for p in self.points), self.threshold)
+        self.axisX.setRange(x0, max(x1, x0 + 1))
+        self.axisY.setRange(0, y_max * 1.1)
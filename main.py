@@ -1,16 +1,28 @@
 # main.py
 import sys
+import argparse
+import multiprocessing
 from PySide6.QtWidgets import QApplication
 from db      import init_all_tables
+from backend import get_backend, set_backend, ServiceBackend
+from auth    import ensure_kdf_params
 from dialogs import LoginDialog
 from main_window import MainWindow   # 这个 MainWindow 就是封装了 Interface_module.py 的 Ui_Form
 
 def main():
-    # 1) 初始化所有表（users + 4 张刀具表）
-    init_all_tables()
+    # 1) 选择数据后端：python main.py --service http://服务器:8765 使用服务模式，
+    #    否则直接打开本地数据库文件并初始化所有表（users + 4 张刀具表）
+    ap = argparse.ArgumentParser(description="刀具管理系统")
+    ap.add_argument("--service", metavar="URL", help="服务端地址，例如 http://服务器:8765")
+    args, qt_args = ap.parse_known_args()
+    if args.service:
+        set_backend(ServiceBackend(args.service))
+    if not get_backend().remote:
+        init_all_tables()
+        ensure_kdf_params()      # 首次运行时在本机标定口令 KDF 代价
 
     # 2) 启动 Qt 应用
-    app = QApplication(sys.argv)
+    app = QApplication([sys.argv[0], *qt_args])
 
     # 3) 弹出登录对话框
     login = LoginDialog()
@@ -26,4 +38,5 @@ def main():
         sys.exit()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()     # 打包后报告生成的工作进程需要
     main()
@@ -2,67 +2,178 @@
 
 import sys
 import os
-import pandas as pd
-import joblib
+import time
+import queue
 
-from PySide6.QtCore        import Qt, QThread, Signal, QPointF
+from PySide6.QtCore        import Qt, QThread, Signal, QPointF, QTimer, QRect, QObject
 from PySide6.QtGui         import (
-    QPainter, QColor, QPen, QBrush, QPixmap,
+    QPainter, QColor, QPen, QBrush, QPixmap, QFont,
     QStandardItemModel, QStandardItem
 )
 from PySide6.QtWidgets     import (
     QMainWindow, QFileDialog, QMessageBox,
     QHeaderView, QGraphicsScene, QAbstractItemView,
-    QGraphicsSimpleTextItem
+    QGraphicsSimpleTextItem, QToolButton, QMenu,
+    QApplication, QLineEdit, QDoubleSpinBox, QPushButton, QLabel, QTabWidget
 )
-from PySide6.QtCharts      import QChart, QPieSeries, QLineSeries, QValueAxis
+from PySide6.QtCharts      import QChart, QPieSeries, QLineSeries, QValueAxis, QAreaSeries
 import PySide6.QtSql        as QtSql
 
 from Interface_module      import Ui_Form
-from db                    import get_conn, DB_FILE
+from db                    import DB_FILE, COND_KEYS, get_conn
+from backend               import get_backend, ServiceError
+from panels                import (
+    EventsPanel, WatchPanel, WearTrendPanel, InventoryBarsPanel, LocationHeatmapPanel, UsagePanel
+)
+from predictor             import build_features
+from ensemble              import load_ensemble, BAND_PERCENTILES
+from csv_loader            import load_sensor_csv
+from live_monitor          import LiveMonitorWorker, LiveWearChart
+from backup                import BackupScheduler
+import image_store
+
+CHART_POLL_MS = 3000          # 可视化界面自动轮询间隔（毫秒）
+CHART_RETRY_MS = 30000        # 服务端不可用时改为每隔多久重试一次
+PIE_COLORS = {"新":"#2ecc71", "良好":"#f1c40f", "差":"#e74c3c"}
+LIVE_SOURCE = "tcp://127.0.0.1:9009"   # 实时监测默认数据源（见 replay_stream.py）
+LIVE_CAPACITY = 2000                    # 实时曲线保留的最近点数
+LIVE_WEAR_FLUSH_S = 10                  # 实时监测的磨损历史每隔多少秒写入一次
+
+
+class BackupBridge(QObject):
+    """把备份线程的完成通知转发到界面线程"""
+    done = Signal(object, object)
+
+
+class WearWriter(QThread):
+    """在后台线程中按顺序写入磨损历史，界面线程只负责排队；stop() 前已排队的批次都会写完"""
+    failed = Signal(str)
 
-MODEL_FILE = "wear_model.pkl"
+    def __init__(self, backend):
+        super().__init__()
+        self.backend = backend
+        self.jobs = queue.Queue()
+
+    def put(self, tool, values, first_run):
+        self.jobs.put((tool, values, first_run))
+
+    def stop(self):
+        self.jobs.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            tool, values, first_run = job
+            try:
+                self.backend.record_wear(tool, values, first_run=first_run)
+            except Exception as e:
+                self.failed.emit(str(e) or type(e).__name__)
 
 
 class PredictWorker(QThread):
     progress = Signal(int)
-    finished = Signal(list, list)
+    finished = Signal(list, list, list, list)      # x, 集成均值, 下分位, 上分位（单模型时为空）
+    quality  = Signal(str)        # 有被剔除的行或自动对应的列名时，数据质量报告
+    failed   = Signal(str)
 
     def __init__(self, csv_path):
         super().__init__()
         self.csv_path = csv_path
 
     def run(self):
-        # 1) 加载模型
+        # 1) 加载模型；文件缺失或损坏时通过 failed 报告，否则界面会一直等待
         self.progress.emit(5)
-        model = joblib.load(MODEL_FILE)
+        try:
+            model = load_ensemble()
+        except Exception as e:
+            self.failed.emit(f"模型加载失败：{type(e).__name__}: {e}")
+            return
         self.progress.emit(20)
 
-        # 2) 读取 CSV 并预处理
-        df = pd.read_csv(self.csv_path)
-        feat_cols = [
-            'time','DOC','feed',
-            'smcAC','smcDC',
-            'vib_table','vib_spindle',
-            'AE_table','AE_spindle'
-        ]
-        X = df[feat_cols]
-        mats = pd.get_dummies(df['material'], prefix='mat')
-        for col in ('mat_1','mat_2'):
-            if col not in mats:
-                mats[col] = 0
-        X = pd.concat([X, mats[['mat_1','mat_2']]], axis=1)
+        # 2) 读取 CSV 并检查数据
+        try:
+            df, report = load_sensor_csv(self.csv_path)
+        except (OSError, ValueError) as e:
+            self.failed.emit(str(e))
+            return
+        if not report.clean:
+            self.quality.emit(report.summary())
+        X = build_features(df)
         self.progress.emit(50)
 
-        # 3) 预测
-        y_pred = model.predict(X)
+        # 3) 预测：K 个成员一次前向计算，得到均值和分位数区间
+        y_pred, lo, hi = model.predict(X.to_numpy(dtype="float32"))
         self.progress.emit(90)
 
         # 4) 发射结果
-        self.finished.emit(list(df.index), y_pred.tolist())
+        band = (lo.tolist(), hi.tolist()) if model.k > 1 else ([], [])
+        self.finished.emit(df.index.tolist(), y_pred.tolist(), *band)
         self.progress.emit(100)
 
 
+class ServiceTableModel(QStandardItemModel):
+    """
+    服务模式下的刀具表模型：数据来自 backend.list_tools，
+    单元格修改即时提交到服务端。每行第 0 列的 UserRole 中保存 rowid，
+    新插入的行在填好 刀具编号 和 刀具型号 后才真正写入。
+    """
+
+    def __init__(self, backend, table: str, parent=None):
+        super().__init__(parent)
+        self.backend = backend
+        self.table = table
+        self.columns = []
+        self.itemChanged.connect(self._on_item_changed)
+
+    def select(self, text: str = ""):
+        data = self.backend.list_tools(self.table, text)
+        self.blockSignals(True)
+        self.clear()
+        self.columns = data["columns"]
+        self.setHorizontalHeaderLabels(self.columns)
+        for rowid, *values in data["rows"]:
+            items = [QStandardItem("" if v is None else str(v)) for v in values]
+            items[0].setData(rowid, Qt.UserRole)
+            self.appendRow(items)
+        self.blockSignals(False)
+        self.layoutChanged.emit()
+
+    def append_blank(self):
+        self.blockSignals(True)
+        self.appendRow([QStandardItem("") for _ in self.columns])
+        self.blockSignals(False)
+        self.layoutChanged.emit()
+
+    def remove(self, row: int):
+        rowid = self.item(row, 0).data(Qt.UserRole)
+        if rowid is not None:
+            self.backend.delete_tool(self.table, rowid)
+        self.removeRow(row)
+
+    def fields(self, row: int):
+        return [(name, self.item(row, c).text()) for c, name in enumerate(self.columns)]
+
+    def _on_item_changed(self, item):
+        row = item.row()
+        key = self.item(row, 0)
+        rowid = key.data(Qt.UserRole)
+        try:
+            if rowid is None:
+                values = {n: v for n, v in self.fields(row) if v != ""}
+                if values.get("刀具编号") and values.get("刀具型号"):
+                    self.blockSignals(True)
+                    key.setData(self.backend.insert_tool(self.table, values), Qt.UserRole)
+                    self.blockSignals(False)
+            else:
+                self.backend.update_tool(self.table, rowid, self.columns[item.column()],
+                                         item.text() or None)
+        except ValueError as e:
+            QMessageBox.warning(None, "保存失败", str(e))
+
+
 class MainWindow(QMainWindow):
     TABLE_MAP = {
         0: "drill_tools",
@@ -83,11 +194,13 @@ class MainWindow(QMainWindow):
         self.ui = Ui_Form()
         self.ui.setupUi(self)
 
-        # 打开 SQLite 数据库
-        db = QtSql.QSqlDatabase.addDatabase("QSQLITE", "tools_conn")
-        db.setDatabaseName(str(DB_FILE))
-        if not db.open():
-            QMessageBox.critical(self, "数据库错误", db.lastError().text())
+        # 直连模式打开 SQLite 数据库；服务模式下所有读写经 backend 转发
+        self.backend = get_backend()
+        if not self.backend.remote:
+            db = QtSql.QSqlDatabase.addDatabase("QSQLITE", "tools_conn")
+            db.setDatabaseName(str(DB_FILE))
+            if not db.open():
+                QMessageBox.critical(self, "数据库错误", db.lastError().text())
 
         # 界面切换按钮
         self.ui.Main_interface_button.clicked.connect(
@@ -97,6 +210,34 @@ class MainWindow(QMainWindow):
         self.ui.Testing_interface_button.clicked.connect(
             lambda: self.ui.stackedWidget.setCurrentWidget(self.ui.Testing_interface))
 
+        # 扩展页面通过“更多功能”菜单切换
+        self.more_button = QToolButton(self)
+        self.more_button.setText("更多功能")
+        self.more_button.setGeometry(QRect(790, 20, 231, 41))
+        font = QFont()
+        font.setPointSize(18)
+        self.more_button.setFont(font)
+        self.more_button.setPopupMode(QToolButton.InstantPopup)
+        self.more_menu = QMenu(self.more_button)
+        self.more_button.setMenu(self.more_menu)
+        self.events_panel = self.add_page("刀具借还记录", EventsPanel(user, self.backend))
+        self.watch_panel = self.add_page("监控文件夹自动分析", WatchPanel(self.backend))
+        self.watch_panel.open_result.connect(self.open_watch_result)
+        if not self.backend.remote:
+            # 图片库在本机；服务模式下请在服务器上用 image_store.py ingest 设置图片
+            self.more_menu.addAction("设置刀具图片…", self.set_tool_image)
+
+        # 定时在线备份（服务模式下由服务端负责）
+        self.backups = None
+        self._backup_manual = False
+        if not self.backend.remote:
+            self.backup_bridge = BackupBridge()
+            self.backup_bridge.done.connect(self.on_backup_done)
+            self.backups = BackupScheduler(on_done=self.backup_bridge.done.emit)
+            self.backups.start()
+            self.more_menu.addSeparator()
+            self.more_menu.addAction("立即备份数据库", self.backup_now)
+
         # 刀具库管理模块
         self.model = None
         self.ui.Tool_category_comboBox.currentIndexChanged.connect(self.load_table)
@@ -107,9 +248,35 @@ class MainWindow(QMainWindow):
         self.ui.Tool_information_view.clicked.connect(self.show_tool_details)
         self.load_table(0)
 
-        # 可视化模块
-        self.ui.Image_refresh_button.clicked.connect(self.refresh_charts)
-        self.refresh_charts()
+        # 可视化模块：饼图只创建一次，之后按数据变化原地更新
+        self._data_version = None
+        self._pie_counts = {}
+        self._pie_slices = {}
+        for table, attr in self.CHART_MAP.items():
+            self._pie_slices[table] = self._init_pie(getattr(self.ui, attr), table)
+        # 饼图右侧的扩展视图；库存统计只读汇总表，点击饼图扇区按该类别和状况下钻
+        self.visual_tabs = QTabWidget(self.ui.Visual_interface)
+        self.visual_tabs.setGeometry(QRect(680, 230, 355, 545))
+        self.inventory_views = [InventoryBarsPanel(self.backend), LocationHeatmapPanel(self.backend),
+                                UsagePanel(self.backend)]
+        for view, title in zip(self.inventory_views, ("分组统计", "库位×状况", "使用次数")):
+            self.visual_tabs.addTab(view, title)
+        self.wear_trend_panel = WearTrendPanel(self.backend)
+        self.visual_tabs.addTab(self.wear_trend_panel, "磨损趋势")
+        self.visual_tabs.currentChanged.connect(self._refresh_inventory)
+        for table, slices in self._pie_slices.items():
+            for k in COND_KEYS:
+                slices[k].clicked.connect(lambda t=table, k=k: self.drill_down(t, k))
+        # 服务模式下连接失败时在这里提示，并暂停轮询直到服务端恢复
+        self.chart_status = QLabel("", self.ui.Visual_interface)
+        self.chart_status.setGeometry(QRect(10, 365, 660, 40))
+        self.chart_status.setStyleSheet("color: #e74c3c;")
+        self._service_down = False
+        self._chart_timer = QTimer(self)
+        self._chart_timer.timeout.connect(self.refresh_charts)
+        self._chart_timer.start(CHART_POLL_MS)
+        self.ui.Image_refresh_button.clicked.connect(lambda: self.refresh_charts(force=True))
+        self.refresh_charts(force=True)
 
         # 磨损检测模块
         self.csv_path = ""
@@ -120,16 +287,57 @@ class MainWindow(QMainWindow):
             pass
         self.ui.Start_data_analysis_button.clicked.connect(self.start_predict)
 
+        # 实时监测（控件直接加在 Testing 页面上）
+        page = self.ui.Testing_interface
+        self.live_source = QLineEdit(LIVE_SOURCE, page)
+        self.live_source.setGeometry(QRect(650, 115, 200, 31))
+        self.live_source.setToolTip("tcp://主机:端口，或不断追加的 CSV 文件/命名管道路径")
+        self.live_threshold = QDoubleSpinBox(page)
+        self.live_threshold.setGeometry(QRect(855, 115, 70, 31))
+        self.live_threshold.setDecimals(2)
+        self.live_threshold.setRange(0.01, 10.0)
+        self.live_threshold.setSingleStep(0.05)
+        self.live_threshold.setValue(0.6)
+        self.live_threshold.setToolTip("磨损量 VB 报警阈值")
+        self.live_button = QPushButton("实时监测", page)
+        self.live_button.setGeometry(QRect(930, 115, 101, 31))
+        self.live_button.clicked.connect(self.toggle_live)
+        self.live_status = QLabel("", page)
+        self.live_status.setGeometry(QRect(190, 226, 751, 28))
+        self.live_worker = None
+        self.live_chart = None
+        self.live_alarm = False
+        # 填写刀具编号后，预测结果和实时监测结果写入磨损历史
+        self.wear_tool = QLineEdit(page)
+        self.wear_tool.setGeometry(QRect(650, 152, 200, 31))
+        self.wear_tool.setPlaceholderText("刀具编号（记录磨损历史）")
+        self._live_wear = []
+        self._live_wear_first = 0
+        self._live_wear_flushed = time.monotonic()
+        self.wear_writer = WearWriter(self.backend)
+        self.wear_writer.failed.connect(
+            lambda msg: self.live_status.setText(f"磨损历史写入失败：{msg}"))
+        self.wear_writer.start()
+
+    def add_page(self, title: str, widget):
+        """把 widget 作为新页面加入 stackedWidget，并在“更多功能”菜单中添加入口"""
+        self.ui.stackedWidget.addWidget(widget)
+        self.more_menu.addAction(title, lambda: self.ui.stackedWidget.setCurrentWidget(widget))
+        return widget
+
     # —— 刀具库操作 —— #
     def load_table(self, idx: int):
         """
         加载第 idx 个刀具表，并优化表格显示（列宽自适应、滚动条按需出现等）。
         """
         table = self.TABLE_MAP[idx]
-        db = QtSql.QSqlDatabase.database("tools_conn")
-        self.model = QtSql.QSqlTableModel(self, db)
-        self.model.setTable(table)
-        self.model.setEditStrategy(QtSql.QSqlTableModel.OnFieldChange)
+        if self.backend.remote:
+            self.model = ServiceTableModel(self.backend, table, self)
+        else:
+            db = QtSql.QSqlDatabase.database("tools_conn")
+            self.model = QtSql.QSqlTableModel(self, db)
+            self.model.setTable(table)
+            self.model.setEditStrategy(QtSql.QSqlTableModel.OnFieldChange)
         self.model.select()
 
         tv = self.ui.Tool_information_view
@@ -149,84 +357,161 @@ class MainWindow(QMainWindow):
 
     def search_tool(self):
         txt = self.ui.Input_tool_information.text().strip()
+        if self.backend.remote:
+            self.model.select(txt)
+            return
         filt = f"刀具编号 LIKE '%{txt}%' OR 刀具型号 LIKE '%{txt}%'" if txt else ""
         self.model.setFilter(filt)
         self.model.select()
 
     def delete_selected(self):
         idx = self.ui.Tool_information_view.currentIndex()
-        if idx.isValid():
+        if not idx.isValid():
+            return
+        if self.backend.remote:
+            self.model.remove(idx.row())
+        else:
             self.model.removeRow(idx.row())
             self.model.submitAll()
 
     def insert_row(self):
-        self.model.insertRow(self.model.rowCount())
+        if self.backend.remote:
+            self.model.append_blank()
+        else:
+            self.model.insertRow(self.model.rowCount())
+
+    def _row_fields(self, row: int):
+        """返回第 row 行的 [(字段名, 值), ...]"""
+        if self.backend.remote:
+            return self.model.fields(row)
+        rec = self.model.record(row)
+        return [(rec.fieldName(c), rec.value(c)) for c in range(rec.count())]
 
     # —— 显示刀具详情 —— #
     def show_tool_details(self, index):
-        rec = self.model.record(index.row())
+        fields = self._row_fields(index.row())
 
         # 1) 在 Tool_data_view 显示所有字段
-        cols = rec.count()
-        m = QStandardItemModel(cols, 2, self)
+        m = QStandardItemModel(len(fields), 2, self)
         m.setHorizontalHeaderLabels(["属性", "值"])
-        for c in range(cols):
-            name = rec.fieldName(c)
-            val  = rec.value(c)
+        for c, (name, val) in enumerate(fields):
             m.setItem(c, 0, QStandardItem(name))
             m.setItem(c, 1, QStandardItem(str(val)))
         tv = self.ui.Tool_data_view
         tv.setModel(m)
         tv.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
 
-        # 2) 在 Tool_image_view 显示三维图
-        relpath = rec.value("刀具图片路径") or ""
-        if getattr(sys, "frozen", False):
-            base = sys._MEIPASS
-        else:
-            base = os.path.dirname(__file__)
-        img_file = os.path.join(base, relpath)
+        # 2) 在 Tool_image_view 显示三维图：优先按 图片哈希 从图片库取缩小副本，
+        #    尚未迁移的行仍按 刀具图片路径 读取
+        values = dict(fields)
+        view_size = self.ui.Tool_image_view.size()
+        digest = values.get("图片哈希") or ""
+        relpath = values.get("刀具图片路径") or ""
+        img_file = None
+        if digest:
+            img_file = image_store.resolve(digest, max(view_size.width(), view_size.height()))
+        elif relpath:
+            if getattr(sys, "frozen", False):
+                base = sys._MEIPASS
+            else:
+                base = os.path.dirname(__file__)
+            img_file = os.path.join(base, relpath)
 
         scene = QGraphicsScene(self.ui.Tool_image_view)
-        if os.path.exists(img_file):
-            pix = QPixmap(img_file)
+        if img_file and os.path.exists(img_file):
+            pix = QPixmap(str(img_file))
             scene.addPixmap(pix.scaled(
-                self.ui.Tool_image_view.size(),
+                view_size,
                 Qt.KeepAspectRatio,
                 Qt.SmoothTransformation
             ))
+        elif digest or relpath:
+            scene.addItem(QGraphicsSimpleTextItem("图片缺失"))
         self.ui.Tool_image_view.setScene(scene)
 
+    def set_tool_image(self):
+        """为当前选中的刀具选择图片，存入图片库并写入 图片哈希（仅直连模式）"""
+        idx = self.ui.Tool_information_view.currentIndex()
+        if not idx.isValid():
+            QMessageBox.warning(self, "提示", "请先在刀具列表中选中一把刀具")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "选择刀具图片", "", "图片 (*.png *.jpg *.jpeg *.bmp)")
+        if not path:
+            return
+        with get_conn() as conn:
+            digest = image_store.ingest(conn, path)
+            conn.commit()
+        names = [name for name, _ in self._row_fields(idx.row())]
+        col = names.index("图片哈希")
+        self.model.setData(self.model.index(idx.row(), col), digest)
+        self.show_tool_details(idx)
+
     # —— 饼状图可视化 —— #
-    def refresh_charts(self):
-        conn = get_conn()
-        cur = conn.cursor()
-        for table, attr in self.CHART_MAP.items():
-            col = "刀具状况" if table in ("drill_tools", "indexable_mill_tools") else "刀具状态"
-            counts = {"新":0, "良好":0, "差":0}
-            for k in counts:
-                cur.execute(f"SELECT COUNT(*) FROM {table} WHERE {col}=?", (k,))
-                counts[k] = cur.fetchone()[0]
-            view = getattr(self.ui, attr)
-            self._draw_pie(view, counts, table)
-        conn.close()
+    def refresh_charts(self, force: bool = False):
+        """
+        按 backend.data_version() 判断数据库是否被修改过（直连模式为
+        PRAGMA data_version，服务模式为服务端的提交计数），
+        没有变化时直接返回；有变化时只更新计数变化的那几张饼图，并刷新当前的库存统计视图。
+        """
+        try:
+            ver = self.backend.data_version()
+            if not force and ver == self._data_version:
+                return
+            for table in self.CHART_MAP:
+                counts = self.backend.condition_counts(table)
+                if force or counts != self._pie_counts.get(table):
+                    self._pie_counts[table] = counts
+                    self._update_pie(self._pie_slices[table], counts)
+        except (OSError, ServiceError) as e:
+            self._on_service_down(e)
+            return
+        self._data_version = ver
+        if self._service_down:
+            self._service_down = False
+            self.chart_status.setText("")
+            self._chart_timer.setInterval(CHART_POLL_MS)
+        for view in self.inventory_views:
+            view.stale = True
+        self._refresh_inventory()
+
+    def _refresh_inventory(self):
+        """只刷新当前可见的库存统计视图，其余的切换到时再刷新"""
+        view = self.visual_tabs.currentWidget()
+        if view in self.inventory_views and view.stale:
+            try:
+                view.refresh()
+            except (OSError, ServiceError) as e:
+                view.stale = True
+                self._on_service_down(e)
+
+    def _on_service_down(self, error):
+        """服务端不可达或返回错误：提示并把轮询间隔放长到 CHART_RETRY_MS，恢复后自动还原"""
+        self._service_down = True
+        self._data_version = None
+        self._chart_timer.setInterval(CHART_RETRY_MS)
+        self.chart_status.setText(f"数据服务不可用（{type(error).__name__}: {error}），"
+                                  f"{CHART_RETRY_MS // 1000} 秒后重试")
+
+    def drill_down(self, table, condition):
+        """点击饼图扇区：库存统计视图按该类别和状况过滤"""
+        for view in self.inventory_views:
+            view.set_filter(table, condition)
+        if self.visual_tabs.currentWidget() not in self.inventory_views:
+            self.visual_tabs.setCurrentWidget(self.inventory_views[0])
+        self._refresh_inventory()
 
     @staticmethod
-    def _draw_pie(view, counts, title):
+    def _init_pie(view, title):
+        """创建饼图及固定的扇区（三种状况 + “无数据”占位），返回扇区字典"""
         series = QPieSeries()
-        total = sum(counts.values())
-        if total == 0:
-            sl = series.append("无数据", 1)
-            sl.setBrush(Qt.lightGray)
-            sl.setLabelVisible(True)
-        else:
-            cmap = {"新":"#2ecc71","良好":"#f1c40f","差":"#e74c3c"}
-            for k,v in counts.items():
-                sl = series.append(f"{k} {v}", v)
-                sl.setBrush(QColor(cmap[k]))
-                sl.setLabelVisible(True)
-                if k=="差" and v>0:
-                    sl.setExploded(True)
+        slices = {}
+        for k in COND_KEYS:
+            sl = series.append(k, 0)
+            sl.setBrush(QColor(PIE_COLORS[k]))
+            slices[k] = sl
+        sl = series.append("无数据", 0)
+        sl.setBrush(Qt.lightGray)
+        slices[None] = sl
         chart = QChart()
         chart.addSeries(series)
         chart.createDefaultAxes()
@@ -234,6 +519,23 @@ class MainWindow(QMainWindow):
         chart.legend().setAlignment(Qt.AlignRight)
         view.setRenderHint(QPainter.Antialiasing)
         view.setChart(chart)
+        return slices
+
+    @staticmethod
+    def _update_pie(slices, counts):
+        """用 setValue / setLabel 原地更新扇区，不重建 QChart"""
+        total = sum(counts.values())
+        empty = slices[None]
+        empty.setValue(0 if total else 1)
+        empty.setLabelVisible(total == 0)
+        series = empty.series()
+        series.chart().legend().markers(series)[-1].setVisible(total == 0)
+        for k, v in counts.items():
+            sl = slices[k]
+            sl.setValue(v)
+            sl.setLabel(f"{k} {v}")
+            sl.setLabelVisible(v > 0)
+            sl.setExploded(k == "差" and v > 0)
 
     # —— 导入 CSV —— #
     def import_csv(self):
@@ -251,15 +553,128 @@ class MainWindow(QMainWindow):
         self.worker = PredictWorker(self.csv_path)
         self.worker.progress.connect(self.ui.Data_analysis_loading_progress_bar.setValue)
         self.worker.finished.connect(self.show_predict)
+        self.worker.finished.connect(lambda x, y_pred, lo, hi: self.record_wear(y_pred))
+        self.worker.quality.connect(lambda text: self.live_status.setText(text.replace("\n", "；")))
+        self.worker.failed.connect(self.on_predict_failed)
         self.worker.start()
 
+    def on_predict_failed(self, msg):
+        self.ui.Data_analysis_loading_progress_bar.setValue(0)
+        QMessageBox.warning(self, "数据文件有误", msg)
+
+    # —— 实时监测 —— #
+    def toggle_live(self):
+        if self.live_worker is not None:
+            # 先断开信号，丢弃已排队但尚未处理的批次
+            self.live_worker.batch.disconnect(self.on_live_batch)
+            self.live_worker.stop()
+            self.live_worker.wait()
+            self.live_worker = None
+            self._flush_live_wear()
+            self.live_button.setText("实时监测")
+            self.live_status.setText("实时监测已停止")
+            return
+        threshold = self.live_threshold.value()
+        self.live_chart = LiveWearChart(
+            self.ui.Data_analysis_result_presentation, threshold, LIVE_CAPACITY)
+        self.live_alarm = False
+        self.live_worker = LiveMonitorWorker(self.live_source.text().strip())
+        self.live_worker.batch.connect(self.on_live_batch)
+        self.live_worker.failed.connect(self.on_live_failed)
+        self.live_worker.finished.connect(self.on_live_finished)
+        self.live_worker.start()
+        self.live_button.setText("停止监测")
+        self.live_status.setStyleSheet("")
+        self.live_status.setText(f"正在监测 {self.live_source.text().strip()}，阈值 VB={threshold:.2f}")
+
+    def on_live_batch(self, xs, ys):
+        self.live_chart.append(xs, ys)
+        if not self._live_wear:
+            self._live_wear_first = xs[0]
+        self._live_wear.extend(ys)
+        if time.monotonic() - self._live_wear_flushed >= LIVE_WEAR_FLUSH_S:
+            self._flush_live_wear()
+        threshold = self.live_chart.threshold
+        vb = max(ys)
+        if vb >= threshold and not self.live_alarm:
+            # 越过阈值时报警一次，回落到阈值以下后才会再次报警
+            self.live_alarm = True
+            QApplication.beep()
+            self.live_status.setStyleSheet("color: white; background: #e74c3c;")
+            self.live_status.setText(f"报警：样本 {xs[ys.index(vb)]} 预测磨损 VB={vb:.3f} 超过阈值 {threshold:.2f}")
+        elif self.live_alarm and ys[-1] < threshold:
+            self.live_alarm = False
+            self.live_status.setStyleSheet("")
+            self.live_status.setText(f"磨损回落到阈值以下（VB={ys[-1]:.3f}）")
+
+    def on_live_failed(self, msg):
+        QMessageBox.warning(self, "实时监测", msg)
+
+    def on_live_finished(self):
+        # 数据源关闭或出错时恢复按钮状态
+        if self.live_worker is not None and not self.live_worker.isRunning():
+            self.live_worker = None
+            self._flush_live_wear()
+            self.live_button.setText("实时监测")
+
+    # —— 磨损历史 —— #
+    def record_wear(self, values, first_run: int = 0):
+        """Testing 页面填写了刀具编号时，把逐次预测 VB 写入磨损历史"""
+        tool = self.wear_tool.text().strip()
+        if not tool or not values:
+            return
+        self.wear_writer.put(tool, list(values), first_run)
+
+    def _flush_live_wear(self):
+        self._live_wear_flushed = time.monotonic()
+        values, self._live_wear = self._live_wear, []
+        self.record_wear(values, self._live_wear_first)
+
+    def open_watch_result(self, x, y_pred):
+        self.ui.stackedWidget.setCurrentWidget(self.ui.Testing_interface)
+        self.show_predict(x, y_pred)
+
+    def backup_now(self):
+        self._backup_manual = True
+        self.backups.run_now()
+
+    def on_backup_done(self, path, error):
+        if error:
+            QMessageBox.warning(self, "备份失败", error)
+        elif self._backup_manual:
+            QMessageBox.information(self, "备份完成", f"已备份到 {path}")
+        self._backup_manual = False
+
+    def closeEvent(self, event):
+        if self.live_worker is not None:
+            self.live_worker.stop()
+            self.live_worker.wait()
+            self._flush_live_wear()
+        self.wear_writer.stop()
+        self.watch_panel.stop()
+        if self.backups is not None:
+            self.backups.stop()
+        super().closeEvent(event)
+
     # —— 显示预测结果 —— #
-    def show_predict(self, x, y_pred):
+    def show_predict(self, x, y_pred, lo=None, hi=None):
         max_pred = float(max(y_pred))
         chart = QChart()
 
+        # 集成模型的分位数区间
+        if lo and hi:
+            upper, lower = QLineSeries(), QLineSeries()
+            upper.replace([QPointF(float(xi), float(v)) for xi, v in zip(x, hi)])
+            lower.replace([QPointF(float(xi), float(v)) for xi, v in zip(x, lo)])
+            band = QAreaSeries(upper, lower)
+            upper.setParent(band); lower.setParent(band)    # 边界线随区间一起释放
+            band.setName(f"{BAND_PERCENTILES[0]}–{BAND_PERCENTILES[1]}% 区间")
+            band.setColor(QColor(0, 122, 204, 60))
+            band.setBorderColor(QColor(0, 122, 204, 0))
+            chart.addSeries(band)
+
         # 预测磨损曲线
-        series_pred = QLineSeries(name="预测磨损")
+        series_pred = QLineSeries(name="预测磨损（集成均值）" if lo and hi else "预测磨损")
         for xi, yi in zip(x, y_pred):
             series_pred.append(float(xi), float(yi))
         series_pred.setPen(QPen(QColor("#007acc"), 2))
@@ -279,12 +694,16 @@ class MainWindow(QMainWindow):
         axisY = QValueAxis()
         axisY.setTitleText("磨损量 VB")
         axisY.setLabelFormat("%.2f")
-        axisY.setRange(0, max_pred * 1.1)
+        # 与报告图表相同：下限取 0 与曲线/区间最小值中较小者，上下各留 10% 余量
+        y_lo = min(0.0, float(min(y_pred)), min(lo or [0.0]))
+        y_hi = max(max_pred, max(hi or [max_pred]))
+        pad = (y_hi - y_lo) * 0.1 or 0.1
+        axisY.setRange(y_lo - (pad if y_lo < 0 else 0), y_hi + pad)
 
         chart.addAxis(axisX, Qt.AlignBottom)
         chart.addAxis(axisY, Qt.AlignLeft)
-        series_pred.attachAxis(axisX); series_pred.attachAxis(axisY)
-        series_max.attachAxis(axisX); series_max.attachAxis(axisY)
+        for series in chart.series():
+            series.attachAxis(axisX); series.attachAxis(axisY)
 
         chart.setTitle("刀具磨损预测与预测最大磨损量")
         chart.legend().setVisible(True)
@@ -0,0 +1,566 @@
+# panels.py
+# 主界面“更多功能”菜单中的扩展页面（纯代码布局，不修改 Interface_module.py）
+
+from PySide6.QtCore    import Qt, QObject, QTimer, QThread, Signal, QDateTime, QPointF, QMargins
+from PySide6.QtGui     import QFont, QStandardItemModel, QStandardItem, QPainter, QPen, QColor
+from PySide6.QtCharts  import (
+    QChart, QChartView, QLineSeries, QValueAxis, QDateTimeAxis, QBarSet, QBarCategoryAxis,
+    QStackedBarSeries, QHorizontalStackedBarSeries
+)
+from PySide6.QtWidgets import (
+    QWidget, QLabel, QLineEdit, QComboBox, QPushButton, QTableView, QSpinBox,
+    QHeaderView, QAbstractItemView, QHBoxLayout, QVBoxLayout, QMessageBox,
+    QFileDialog
+)
+
+from db           import TABLE_LABELS, COND_KEYS, USAGE_BUCKETS, get_conn, get_setting, set_setting
+from tool_events  import EVENT_KINDS
+from watch_folder import FolderWatcher, recent_results, load_predictions
+import report
+
+
+def _fill_table(view: QTableView, headers, rows):
+    """把 rows 填入一个只读 QStandardItemModel 并设置到 view"""
+    m = QStandardItemModel(len(rows), len(headers), view)
+    m.setHorizontalHeaderLabels(headers)
+    for r, row in enumerate(rows):
+        for c, val in enumerate(row):
+            item = QStandardItem("" if val is None else str(val))
+            item.setEditable(False)
+            m.setItem(r, c, item)
+    view.setModel(m)
+    view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+    view.horizontalHeader().setStretchLastSection(True)
+
+
+COND_COLORS = {"新": "#2ecc71", "良好": "#f1c40f", "差": "#e74c3c", "其他": "#bdc3c7"}
+MAX_BARS = 15                 # 分组统计最多显示的取值个数（按数量取前若干项）
+
+
+def _title(text: str) -> QLabel:
+    label = QLabel(text)
+    font = QFont()
+    font.setPointSize(14)
+    label.setFont(font)
+    return label
+
+
+class EventsPanel(QWidget):
+    """借还记录：登记借用/归还/修磨/报废，查看当前持有与周利用率"""
+
+    def __init__(self, user: str, backend, parent=None):
+        super().__init__(parent)
+        self.user = user
+        self.backend = backend
+
+        # —— 登记事件 —— #
+        self.table_box = QComboBox()
+        for table, label in TABLE_LABELS.items():
+            self.table_box.addItem(label, table)
+        self.tool_edit = QLineEdit()
+        self.tool_edit.setPlaceholderText("刀具编号")
+        self.kind_box = QComboBox()
+        for kind, label in EVENT_KINDS.items():
+            self.kind_box.addItem(label, kind)
+        self.operator_edit = QLineEdit(user)
+        self.operator_edit.setPlaceholderText("操作人")
+        submit = QPushButton("登记")
+        submit.clicked.connect(self.submit)
+        form = QHBoxLayout()
+        for w in (self.table_box, self.tool_edit, self.kind_box, self.operator_edit, submit):
+            form.addWidget(w)
+
+        # —— 当前持有 —— #
+        self.holder_edit = QLineEdit()
+        self.holder_edit.setPlaceholderText("按借用人过滤（留空显示全部）")
+        self.holder_edit.returnPressed.connect(self.refresh)
+        query = QPushButton("查询")
+        query.clicked.connect(self.refresh)
+        holder_row = QHBoxLayout()
+        holder_row.addWidget(self.holder_edit)
+        holder_row.addWidget(query)
+        self.holdings_view = QTableView()
+        self.util_view = QTableView()
+        for tv in (self.holdings_view, self.util_view):
+            tv.setSelectionBehavior(QAbstractItemView.SelectRows)
+            tv.setAlternatingRowColors(True)
+
+        lay = QVBoxLayout(self)
+        lay.addWidget(_title("刀具借还登记"))
+        lay.addLayout(form)
+        lay.addWidget(_title("当前持有"))
+        lay.addLayout(holder_row)
+        lay.addWidget(self.holdings_view, 3)
+        lay.addWidget(_title("各类刀具周利用率"))
+        lay.addWidget(self.util_view, 2)
+
+        self.refresh()
+
+    def submit(self):
+        try:
+            self.backend.record_event(
+                self.table_box.currentData(),
+                self.tool_edit.text().strip(),
+                self.kind_box.currentData(),
+                self.operator_edit.text().strip(),
+            )
+        except ValueError as e:
+            QMessageBox.warning(self, "登记失败", str(e))
+            return
+        self.tool_edit.clear()
+        self.refresh()
+
+    def refresh(self):
+        rows = [
+            (who, TABLE_LABELS.get(table, table), tool, ts)
+            for who, table, tool, ts in self.backend.holdings(self.holder_edit.text().strip())
+        ]
+        _fill_table(self.holdings_view, ["借用人", "刀具类别", "刀具编号", "借用时间"], rows)
+
+        rows = [
+            (week, TABLE_LABELS.get(table, table), n, f"{hours:.1f}", f"{util:.1%}")
+            for table, week, n, hours, util in self.backend.weekly_utilization()
+        ]
+        _fill_table(self.util_view, ["周", "刀具类别", "借用次数", "借用小时", "利用率"], rows)
+
+
+class _ResultBridge(QObject):
+    """把工作线程中的分析结果转发到界面线程"""
+    arrived = Signal(dict)
+
+
+class ReportWorker(QThread):
+    """后台生成 PDF 报告（渲染在 report.generate 的工作进程中进行）"""
+    progress = Signal(int, int)
+    done     = Signal(str, int)
+    failed   = Signal(str)
+
+    def __init__(self, ids, path: str):
+        super().__init__()
+        self.ids = ids
+        self.path = path
+
+    def run(self):
+        try:
+            n = report.generate(self.ids, self.path, progress=self.progress.emit)
+        except Exception as e:
+            self.failed.emit(f"{type(e).__name__}: {e}")
+            return
+        self.done.emit(self.path, n)
+
+
+class WatchPanel(QWidget):
+    """监控文件夹自动分析：启动/停止监控，结果随到随显示，双击查看磨损曲线"""
+    open_result = Signal(list, list)
+
+    def __init__(self, backend, parent=None):
+        super().__init__(parent)
+        self.watcher = None
+        self.bridge = _ResultBridge()
+        self.bridge.arrived.connect(self.on_result)
+
+        self.folder_edit = QLineEdit()
+        self.folder_edit.setPlaceholderText("采集工位写入 CSV 的共享文件夹")
+        browse = QPushButton("浏览")
+        browse.clicked.connect(self.browse)
+        self.workers_box = QSpinBox()
+        self.workers_box.setRange(1, 16)
+        self.workers_box.setValue(2)
+        self.workers_box.setPrefix("并发 ")
+        self.start_button = QPushButton("开始监控")
+        self.start_button.clicked.connect(self.toggle)
+        self.report_button = QPushButton("导出报告")
+        self.report_button.setToolTip("把选中的（未选中时为全部）已完成分析导出为多页 PDF")
+        self.report_button.clicked.connect(self.export_report)
+        self.report_worker = None
+        row = QHBoxLayout()
+        for w in (self.folder_edit, browse, self.workers_box, self.start_button, self.report_button):
+            row.addWidget(w)
+        self.status = QLabel("未启动")
+        self.view = QTableView()
+        self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.view.setAlternatingRowColors(True)
+        self.view.doubleClicked.connect(self.show_curve)
+
+        lay = QVBoxLayout(self)
+        lay.addWidget(_title("监控文件夹自动分析"))
+        lay.addLayout(row)
+        lay.addWidget(self.status)
+        lay.addWidget(self.view)
+
+        # 结果成批到达时合并刷新，最多每 0.5 秒重查一次
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(500)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+        if backend.remote:
+            # 监控程序需要直接写数据库，服务模式下应在服务器上运行 watch_folder.py
+            for w in (self.folder_edit, browse, self.workers_box, self.start_button,
+                      self.report_button):
+                w.setEnabled(False)
+            self.status.setText("服务模式下请在服务器上运行 python watch_folder.py <文件夹>")
+            return
+        with get_conn() as conn:
+            self.folder_edit.setText(get_setting(conn, "watch_dir", ""))
+        self.refresh()
+
+    def browse(self):
+        path = QFileDialog.getExistingDirectory(self, "选择监控文件夹", self.folder_edit.text())
+        if path:
+            self.folder_edit.setText(path)
+
+    def toggle(self):
+        if self.watcher is not None:
+            self.stop()
+            return
+        folder = self.folder_edit.text().strip()
+        if not folder:
+            QMessageBox.warning(self, "提示", "请先选择监控文件夹")
+            return
+        with get_conn() as conn:
+            set_setting(conn, "watch_dir", folder)
+            conn.commit()
+        self.watcher = FolderWatcher(folder, self.workers_box.value(), self.bridge.arrived.emit)
+        self.watcher.start()
+        self.start_button.setText("停止监控")
+        self.workers_box.setEnabled(False)
+        self.status.setText(f"正在监控 {self.watcher.folder}")
+
+    def stop(self):
+        if self.watcher is None:
+            return
+        self.watcher.stop()
+        self.watcher = None
+        self.start_button.setText("开始监控")
+        self.workers_box.setEnabled(True)
+        self.status.setText("已停止（未完成的文件下次启动时继续处理）")
+
+    def on_result(self, result):
+        if result["状态"] == "done":
+            self.status.setText(f"已完成 {result['文件路径']}：最大 VB {result['最大VB']:.3f}")
+        else:
+            self.status.setText(f"分析失败 {result['文件路径']}：{result['错误']}")
+        if not self.refresh_timer.isActive():
+            self.refresh_timer.start()
+
+    def refresh(self):
+        rows = [
+            (rid, ts, path, tool, state, n,
+             "" if vb_max is None else f"{vb_max:.3f}",
+             "" if vb_last is None else f"{vb_last:.3f}", err)
+            for rid, ts, path, tool, state, n, vb_max, vb_last, err in recent_results()
+        ]
+        _fill_table(self.view, ["序号", "分析时间", "文件", "刀具编号", "状态",
+                                "样本数", "最大VB", "最终VB", "错误"], rows)
+
+    def export_report(self):
+        rows = {i.row() for i in self.view.selectionModel().selectedRows()} if self.view.model() else set()
+        ids = report.select_results(ids=[int(self.view.model().item(r, 0).text()) for r in rows]) \
+            if rows else report.select_results()
+        if not ids:
+            QMessageBox.information(self, "提示", "没有已完成的分析结果")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "导出分析报告", "wear_report.pdf", "PDF (*.pdf)")
+        if not path:
+            return
+        self.report_button.setEnabled(False)
+        self.report_worker = ReportWorker(ids, path)
+        self.report_worker.progress.connect(
+            lambda i, n: self.status.setText(f"正在生成报告 {i}/{n}"))
+        self.report_worker.done.connect(
+            lambda p, n: self.status.setText(f"已导出 {n} 页报告：{p}"))
+        self.report_worker.failed.connect(lambda msg: QMessageBox.warning(self, "导出失败", msg))
+        self.report_worker.finished.connect(lambda: self.report_button.setEnabled(True))
+        self.report_worker.start()
+
+    def show_curve(self, index):
+        rid = int(self.view.model().item(index.row(), 0).text())
+        y = load_predictions(rid)
+        if y:
+            self.open_result.emit(list(range(len(y))), y)
+
+
+class WearTrendPanel(QWidget):
+    """磨损趋势：单把刀具或某生产商全部刀具在最近 N 天的 VB 趋势（读取预聚合数据）"""
+
+    def __init__(self, backend, parent=None):
+        super().__init__(parent)
+        self.backend = backend
+
+        self.mode_box = QComboBox()
+        self.mode_box.addItem("按刀具", "tool")
+        self.mode_box.addItem("按生产商", "supplier")
+        self.mode_box.currentIndexChanged.connect(self.on_mode)
+        self.table_box = QComboBox()
+        for table, label in TABLE_LABELS.items():
+            self.table_box.addItem(label, table)
+        self.table_box.currentIndexChanged.connect(self.load_suppliers)
+        self.tool_edit = QLineEdit()
+        self.tool_edit.setPlaceholderText("刀具编号")
+        self.tool_edit.returnPressed.connect(self.query)
+        self.supplier_box = QComboBox()
+        self.days_box = QSpinBox()
+        self.days_box.setRange(1, 3650)
+        self.days_box.setValue(90)
+        self.days_box.setPrefix("最近 ")
+        self.days_box.setSuffix(" 天")
+        query = QPushButton("查询")
+        query.clicked.connect(self.query)
+        row1 = QHBoxLayout()
+        row1.addWidget(self.mode_box)
+        row1.addWidget(self.table_box)
+        row2 = QHBoxLayout()
+        row2.addWidget(self.tool_edit, 1)
+        row2.addWidget(self.supplier_box, 1)
+        row2.addWidget(self.days_box)
+        row2.addWidget(query)
+        self.status = QLabel("")
+
+        self.chart = QChart()
+        self.chart.legend().setAlignment(Qt.AlignBottom)
+        self.series_mean = QLineSeries(name="平均 VB")
+        self.series_mean.setPen(QPen(QColor("#007acc"), 2))
+        self.series_max = QLineSeries(name="最大 VB")
+        self.series_max.setPen(QPen(QColor("#e74c3c"), 1, Qt.DashLine))
+        self.axis_x = QDateTimeAxis()
+        self.axis_y = QValueAxis()
+        self.axis_y.setTitleText("磨损量 VB")
+        self.axis_y.setLabelFormat("%.2f")
+        self.chart.addAxis(self.axis_x, Qt.AlignBottom)
+        self.chart.addAxis(self.axis_y, Qt.AlignLeft)
+        for s in (self.series_mean, self.series_max):
+            self.chart.addSeries(s)
+            s.attachAxis(self.axis_x)
+            s.attachAxis(self.axis_y)
+        view = QChartView(self.chart)
+        view.setRenderHint(QPainter.Antialiasing)
+
+        lay = QVBoxLayout(self)
+        lay.addLayout(row1)
+        lay.addLayout(row2)
+        lay.addWidget(self.status)
+        lay.addWidget(view, 1)
+
+        self.on_mode()
+
+    def on_mode(self):
+        by_tool = self.mode_box.currentData() == "tool"
+        self.tool_edit.setVisible(by_tool)
+        self.supplier_box.setVisible(not by_tool)
+        self.table_box.setEnabled(not by_tool)
+        if not by_tool:
+            self.load_suppliers()
+
+    def load_suppliers(self):
+        if self.mode_box.currentData() != "supplier":
+            return
+        self.supplier_box.clear()
+        self.supplier_box.addItems(self.backend.wear_suppliers(self.table_box.currentData()))
+
+    def query(self):
+        days = self.days_box.value()
+        if self.mode_box.currentData() == "tool":
+            tool = self.tool_edit.text().strip()
+            if not tool:
+                QMessageBox.warning(self, "提示", "请输入刀具编号")
+                return
+            res = self.backend.wear_trend(tool_id=tool, days=days)
+            what = tool
+        else:
+            supplier = self.supplier_box.currentText()
+            if not supplier:
+                QMessageBox.warning(self, "提示", "该类刀具没有生产商数据")
+                return
+            res = self.backend.wear_trend(table=self.table_box.currentData(),
+                                          supplier=supplier, days=days)
+            what = f"{supplier} {self.table_box.currentText()}"
+        self.show_trend(what, res)
+
+    def show_trend(self, what: str, res: dict):
+        rows = res["rows"]
+        hourly = res["level"] == "hour"
+        self.series_mean.replace([QPointF(start * 1000.0, mean) for start, _, _, mean, _ in rows])
+        self.series_max.replace([QPointF(start * 1000.0, vb_max) for start, _, vb_max, _, _ in rows])
+        self.axis_x.setFormat("MM-dd hh:mm" if hourly else "yyyy-MM-dd")
+        now = QDateTime.currentDateTime()
+        self.axis_x.setRange(now.addDays(-self.days_box.value()), now)
+        top = max((r[2] for r in rows), default=0)
+        self.axis_y.setRange(0, top * 1.1 or 1)
+        self.chart.setTitle(f"{what} 磨损趋势（按{'小时' if hourly else '天'}）")
+        if rows:
+            n = sum(r[1] for r in rows)
+            self.status.setText(f"{len(rows)} 个时段，共 {n} 次运行，最大 VB {top:.3f}")
+        else:
+            self.status.setText("所选范围内没有磨损记录")
+
+
+class _InventoryView(QWidget):
+    """
+    库存汇总视图的公共部分：类别/状况过滤，数据只来自 backend.inventory_rollup。
+    数据库变化后由主窗口把 stale 置位，视图可见时再刷新。
+    """
+
+    def __init__(self, backend, parent=None):
+        super().__init__(parent)
+        self.backend = backend
+        self.stale = True
+        self.table_box = QComboBox()
+        self.table_box.addItem("全部类别", None)
+        for table, label in TABLE_LABELS.items():
+            self.table_box.addItem(label, table)
+        self.cond_box = QComboBox()
+        self.cond_box.addItem("全部状况", None)
+        for k in COND_KEYS:
+            self.cond_box.addItem(k, k)
+        for box in (self.table_box, self.cond_box):
+            box.currentIndexChanged.connect(self.refresh)
+        self.filters = QHBoxLayout()
+        self.filters.addWidget(self.table_box)
+        self.filters.addWidget(self.cond_box)
+        self.lay = QVBoxLayout(self)
+        self.lay.addLayout(self.filters)
+
+    def set_filter(self, table=None, condition=None):
+        for box, value in ((self.table_box, table), (self.cond_box, condition)):
+            box.blockSignals(True)
+            box.setCurrentIndex(max(box.findData(value), 0))
+            box.blockSignals(False)
+        self.stale = True
+
+    def pivot(self, dimension):
+        """读取汇总并转成 {取值: {状况: 数量}}（三种状况之外的归入“其他”）"""
+        table = {}
+        for value, cond, n in self.backend.inventory_rollup(
+                dimension, self.table_box.currentData(), self.cond_box.currentData()):
+            key = cond if cond in COND_KEYS else "其他"
+            row = table.setdefault(value or "未填写", dict.fromkeys(COND_COLORS, 0))
+            row[key] += n
+        return table
+
+    def refresh(self):
+        self.stale = False
+
+
+class _StackedBars(_InventoryView):
+    """按状况堆叠的条形图"""
+    horizontal = False
+
+    def __init__(self, backend, parent=None):
+        super().__init__(backend, parent)
+        self.chart = QChart()
+        self.chart.legend().setAlignment(Qt.AlignBottom)
+        self.chart.setMargins(QMargins(4, 4, 4, 4))
+        self.view = QChartView(self.chart)
+        self.view.setRenderHint(QPainter.Antialiasing)
+        self.lay.addWidget(self.view, 1)
+
+    def show_bars(self, title, categories, data):
+        self.chart.removeAllSeries()
+        for axis in self.chart.axes():
+            self.chart.removeAxis(axis)
+        series = QHorizontalStackedBarSeries() if self.horizontal else QStackedBarSeries()
+        for key, color in COND_COLORS.items():
+            values = [data[c][key] for c in categories]
+            if not any(values):
+                continue
+            bar = QBarSet(key)
+            bar.append([float(v) for v in values])
+            bar.setColor(QColor(color))
+            series.append(bar)
+        self.chart.addSeries(series)
+        cat_axis = QBarCategoryAxis()
+        cat_axis.append(categories)
+        val_axis = QValueAxis()
+        val_axis.setLabelFormat("%d")
+        top = max((sum(data[c].values()) for c in categories), default=0)
+        val_axis.setRange(0, max(top, 1))
+        if self.horizontal:
+            self.chart.addAxis(cat_axis, Qt.AlignLeft)
+            self.chart.addAxis(val_axis, Qt.AlignBottom)
+        else:
+            self.chart.addAxis(cat_axis, Qt.AlignBottom)
+            self.chart.addAxis(val_axis, Qt.AlignLeft)
+        series.attachAxis(cat_axis)
+        series.attachAxis(val_axis)
+        font = cat_axis.labelsFont()
+        font.setPointSize(8)
+        cat_axis.setLabelsFont(font)
+        # 较长的取值在轴上会被省略，悬停时显示完整名称和数量
+        series.hovered.connect(lambda status, i, bar: self.view.setToolTip(
+            f"{categories[i]}  {bar.label()} {int(bar.at(i))}" if status else ""))
+        self.chart.setTitle(title)
+
+
+class InventoryBarsPanel(_StackedBars):
+    """按生产商（或刀具材料、适合加工材料、库存状态）分组、按状况堆叠的条形图"""
+    horizontal = True
+    DIMENSIONS = ("生产商", "刀具材料", "适合加工材料", "库存状态")
+
+    def __init__(self, backend, parent=None):
+        super().__init__(backend, parent)
+        self.dim_box = QComboBox()
+        self.dim_box.addItems(self.DIMENSIONS)
+        self.dim_box.currentIndexChanged.connect(self.refresh)
+        self.filters.insertWidget(0, self.dim_box)
+
+    def refresh(self):
+        super().refresh()
+        dim = self.dim_box.currentText()
+        data = self.pivot(dim)
+        ranked = sorted(data, key=lambda v: -sum(data[v].values()))
+        shown = ranked[:MAX_BARS]
+        title = f"按{dim}统计"
+        if len(ranked) > len(shown):
+            title += f"（前 {len(shown)} 项，共 {len(ranked)} 项）"
+        # 横向条形图自下而上排列，数量最多的放在最上面
+        self.show_bars(title, shown[::-1], data)
+
+
+class UsagePanel(_StackedBars):
+    """使用次数分布"""
+
+    def refresh(self):
+        super().refresh()
+        data = self.pivot("使用次数")
+        for bucket in USAGE_BUCKETS:
+            data.setdefault(bucket, dict.fromkeys(COND_COLORS, 0))
+        self.show_bars("使用次数分布", list(USAGE_BUCKETS), data)
+
+
+class LocationHeatmapPanel(_InventoryView):
+    """库存位置 × 刀具状况 热力表：颜色深浅表示数量"""
+
+    def __init__(self, backend, parent=None):
+        super().__init__(backend, parent)
+        self.view = QTableView()
+        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.view.verticalHeader().setVisible(False)
+        self.lay.addWidget(self.view, 1)
+
+    def refresh(self):
+        super().refresh()
+        data = self.pivot("库存位置")
+        keys = [k for k in COND_COLORS if any(row[k] for row in data.values())] or list(COND_KEYS)
+        headers = ["库存位置", *keys, "合计"]
+        locations = sorted(data)
+        m = QStandardItemModel(len(locations), len(headers), self.view)
+        m.setHorizontalHeaderLabels(headers)
+        peak = max((row[k] for row in data.values() for k in keys), default=0) or 1
+        for r, loc in enumerate(locations):
+            m.setItem(r, 0, QStandardItem(loc))
+            for c, k in enumerate(keys, 1):
+                n = data[loc][k]
+                item = QStandardItem(str(n) if n else "")
+                item.setTextAlignment(Qt.AlignCenter)
+                if n:
+                    color = QColor(COND_COLORS[k])
+                    color.setAlphaF(0.15 + 0.85 * n / peak)
+                    item.setBackground(color)
+                m.setItem(r, c, item)
+            total = QStandardItem(str(sum(data[loc].values())))
+            total.setTextAlignment(Qt.AlignCenter)
+            m.setItem(r, len(headers) - 1, total)
+        self.view.setModel(m)
+        self.view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.view.horizontalHeader().setStretchLastSection(True)
@@ -0,0 +1,35 @@
+# predictor.py
+# 磨损预测模型的加载与特征预处理，供 PredictWorker 和实时监测共用
+
+import threading
+
+import pandas as pd
+import joblib
+
+MODEL_FILE = "wear_model.pkl"
+FEAT_COLS = [
+    'time','DOC','feed',
+    'smcAC','smcDC',
+    'vib_table','vib_spindle',
+    'AE_table','AE_spindle'
+]
+
+_model = None
+_model_lock = threading.Lock()
+
+def load_model():
+    """加载并缓存 wear_model.pkl（多个线程共用同一份模型）"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = joblib.load(MODEL_FILE)
+        return _model
+
+def build_features(df: pd.DataFrame) -> pd.DataFrame:
+    """按训练时的列顺序构造特征：9 个数值特征 + material 的 one-hot（mat_1, mat_2）"""
+    X = df[FEAT_COLS]
+    mats = pd.get_dummies(df['material'], prefix='mat')
+    for col in ('mat_1','mat_2'):
+        if col not in mats:
+            mats[col] = 0
+    return pd.concat([X, mats[['mat_1','mat_2']]], axis=1)
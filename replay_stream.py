@@ -0,0 +1,82 @@
+# replay_stream.py
+# 回放工具：把 testing_mill.csv 之类的特征文件按指定速率推送给实时监测，
+# 用于在没有采集设备时测试“实时监测”功能。
+#
+#   python replay_stream.py testing_mill.csv --port 9009 --rate 2 --loop
+#   python replay_stream.py testing_mill.csv --out live.csv --rate 5   # 追加写文件，供 tail 模式使用
+
+import sys
+import time
+import socket
+import argparse
+
+
+def _rows(path):
+    with open(path, encoding="utf-8-sig") as f:
+        header = f.readline()
+        rows = [line for line in f if line.strip()]
+    return header, rows
+
+
+def _paced(rows, rate: float, loop: bool):
+    """按 rate 行/秒产出数据行；loop 时循环回放"""
+    interval = 1.0 / rate if rate > 0 else 0.0
+    next_t = time.monotonic()
+    while True:
+        for row in rows:
+            next_t += interval
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            yield row if row.endswith("\n") else row + "\n"
+        if not loop:
+            return
+
+
+def serve(path, host, port, rate, loop):
+    header, rows = _rows(path)
+    with socket.create_server((host, port)) as srv:
+        print(f"回放服务已启动：tcp://{host}:{port}，{rate} 行/秒")
+        while True:
+            conn, addr = srv.accept()
+            print(f"客户端已连接：{addr}")
+            try:
+                with conn:
+                    conn.sendall(header.encode("utf-8"))
+                    for row in _paced(rows, rate, loop):
+                        conn.sendall(row.encode("utf-8"))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            print(f"客户端已断开：{addr}")
+
+
+def write_file(path, out, rate, loop):
+    header, rows = _rows(path)
+    with open(out, "w", encoding="utf-8", newline="") as f:
+        f.write(header)
+        f.flush()
+        for row in _paced(rows, rate, loop):
+            f.write(row)
+            f.flush()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="按指定速率回放特征 CSV")
+    ap.add_argument("csv", nargs="?", default="testing_mill.csv")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9009)
+    ap.add_argument("--rate", type=float, default=2.0, help="每秒行数，0 表示不限速")
+    ap.add_argument("--loop", action="store_true", help="循环回放")
+    ap.add_argument("--out", help="不启动 TCP 服务，而是逐行追加写到该文件")
+    args = ap.parse_args(argv)
+    try:
+        if args.out:
+            write_file(args.csv, args.out, args.rate, args.loop)
+        else:
+            serve(args.csv, args.host, args.port, args.rate, args.loop)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+# report.py
+# 磨损分析报告：把 analysis_results 中的分析结果逐条渲染为报告页
+# （刀具信息汇总表 + 磨损曲线 + 最大 VB 标注），合并为一个多页 PDF，也可同时输出每页 PNG。
+#
+#   python report.py -o report.pdf                    # 所有已完成的分析
+#   python report.py -o report.pdf --tool DR880-20-5D --since 2024-01-01 --png-dir pages/
+#
+# 图表在多个工作进程中用 offscreen 平台离屏渲染成图片，主进程按顺序逐页写入 PDF；
+# 同时在途的页数有上限，内存占用与报告页数无关。
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from collections import deque
+
+from PySide6.QtCore   import Qt, QPointF, QRectF, QBuffer, QByteArray, QIODevice, QMarginsF
+from PySide6.QtGui    import (
+    QPainter, QColor, QPen, QBrush, QFont, QImage, QPageSize, QPageLayout, QPdfWriter
+)
+
+from db import DB_FILE, get_conn
+
+CHART_W, CHART_H = 1600, 900        # 图表图片像素
+PDF_DPI = 150
+SUMMARY_FIELDS = ("刀具编号", "文件路径", "分析时间", "样本数", "最大VB", "平均VB", "最终VB")
+
+_app = None
+
+
+def _ensure_app():
+    """离屏渲染需要一个 QApplication；没有显示器时使用 offscreen 平台"""
+    global _app
+    from PySide6.QtWidgets import QApplication
+    _app = QApplication.instance()
+    if _app is None:
+        if not os.environ.get("DISPLAY") and sys.platform.startswith("linux"):
+            os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        _app = QApplication([])
+    return _app
+
+
+def select_results(tool: str = None, since: str = None, ids=None):
+    """符合条件的已完成分析的 id 列表（按时间顺序）"""
+    sql = "SELECT id FROM analysis_results WHERE 状态='done'"
+    args = []
+    if tool:
+        sql += " AND 刀具编号=?"
+        args.append(tool)
+    if since:
+        sql += " AND 分析时间>=?"
+        args.append(since)
+    if ids:
+        sql += f" AND id IN ({','.join('?' * len(ids))})"
+        args.extend(ids)
+    with get_conn() as conn:
+        return [r[0] for r in conn.execute(sql + " ORDER BY 分析时间, id", args)]
+
+
+def render_chart(y, width: int = CHART_W, height: int = CHART_H) -> QImage:
+    """离屏渲染磨损曲线（样式与磨损检测界面一致），返回 QImage"""
+    from PySide6.QtWidgets import QGraphicsScene, QGraphicsSimpleTextItem
+    from PySide6.QtCharts  import QChart, QLineSeries, QValueAxis
+
+    x = range(len(y))
+    max_pred = float(max(y))
+    i_max = max(range(len(y)), key=y.__getitem__)
+    chart = QChart()
+    chart.setAnimationOptions(QChart.NoAnimation)
+
+    series_pred = QLineSeries(name="预测磨损")
+    series_pred.replace([QPointF(float(xi), float(yi)) for xi, yi in zip(x, y)])
+    series_pred.setPen(QPen(QColor("#007acc"), 2))
+    chart.addSeries(series_pred)
+
+    series_max = QLineSeries(name="预测最大磨损量")
+    series_max.append(0, max_pred)
+    series_max.append(max(len(y) - 1, 1), max_pred)
+    series_max.setPen(QPen(QColor("#e74c3c"), 2, Qt.DashLine))
+    chart.addSeries(series_max)
+
+    axisX = QValueAxis()
+    axisX.setTitleText("运行次数 (time)")
+    axisX.setLabelFormat("%d")
+    axisX.setRange(0, max(len(y) - 1, 1))
+    axisY = QValueAxis()
+    axisY.setTitleText("磨损量 VB")
+    axisY.setLabelFormat("%.2f")
+    # 集成均值在 VB≈0 附近可能略小于 0，下限取 0 与最小值中较小者，上下各留 10% 余量
+    y_lo, y_hi = min(0.0, float(min(y))), max_pred
+    pad = (y_hi - y_lo) * 0.1 or 0.1
+    axisY.setRange(y_lo - (pad if y_lo < 0 else 0), y_hi + pad)
+    chart.addAxis(axisX, Qt.AlignBottom)
+    chart.addAxis(axisY, Qt.AlignLeft)
+    for s in (series_pred, series_max):
+        s.attachAxis(axisX)
+        s.attachAxis(axisY)
+    chart.setTitle("刀具磨损预测与预测最大磨损量")
+    chart.legend().setAlignment(Qt.AlignRight)
+
+    scene = QGraphicsScene()
+    scene.addItem(chart)
+    chart.setGeometry(QRectF(0, 0, width, height))
+    chart.layout().activate()
+
+    # 标注最大值及其位置
+    pos = chart.mapToPosition(QPointF(i_max, max_pred), series_pred)
+    text = QGraphicsSimpleTextItem(f"最大 VB {max_pred:.3f}（第 {i_max} 次）")
+    text.setBrush(QBrush(QColor("#e74c3c")))
+    b = text.boundingRect()
+    text.setPos(min(pos.x() + 8, width - b.width() - 8), pos.y() - b.height() - 4)
+    scene.addItem(text)
+
+    img = QImage(width, height, QImage.Format_RGB32)
+    img.fill(Qt.white)
+    p = QPainter(img)
+    p.setRenderHint(QPainter.Antialiasing)
+    scene.render(p, QRectF(0, 0, width, height), QRectF(0, 0, width, height))
+    p.end()
+    return img
+
+
+def _render_job(rid: int, png_dir: str = None):
+    """工作进程：读取一条分析结果并渲染图表，返回 (汇总信息, PNG 字节)"""
+    _ensure_app()
+    with get_conn() as conn:
+        row = conn.execute(f"""
+            SELECT {', '.join(SUMMARY_FIELDS)}, 预测值 FROM analysis_results WHERE id=?
+        """, (rid,)).fetchone()
+    info = dict(zip(SUMMARY_FIELDS, row[:-1]))
+    info["id"] = rid
+    img = render_chart(json.loads(row[-1]))
+    data = QByteArray()
+    buf = QBuffer(data)
+    buf.open(QIODevice.WriteOnly)
+    img.save(buf, "PNG")
+    png = bytes(data)
+    if png_dir:
+        name = f"{rid}_{info['刀具编号'] or 'unknown'}.png"
+        with open(os.path.join(png_dir, name), "wb") as f:
+            f.write(png)
+    return info, png
+
+
+def _init_worker(db_file):
+    import db
+    db.DB_FILE = db_file
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+
+
+def _fmt(name, value):
+    if value is None:
+        return ""
+    if name.endswith("VB"):
+        return f"{value:.3f}"
+    return str(value)
+
+
+class PdfReport:
+    """逐页写入的 PDF：add_page 后该页即写出，不在内存中保留"""
+
+    def __init__(self, path: str):
+        self.writer = QPdfWriter(path)
+        self.writer.setResolution(PDF_DPI)
+        self.writer.setPageLayout(QPageLayout(QPageSize(QPageSize.A4), QPageLayout.Portrait,
+                                              QMarginsF(15, 15, 15, 15), QPageLayout.Millimeter))
+        self.writer.setTitle("刀具磨损分析报告")
+        self.painter = None
+        self.pages = 0
+
+    def add_page(self, info: dict, png: bytes):
+        if self.painter is None:
+            self.painter = QPainter(self.writer)
+        else:
+            self.writer.newPage()
+        p = self.painter
+        rect = self.writer.pageLayout().paintRectPixels(PDF_DPI)
+        w = rect.width()
+        y = 0
+
+        font = QFont()
+        font.setPointSize(16)
+        font.setBold(True)
+        p.setFont(font)
+        p.drawText(QRectF(0, y, w, 60), Qt.AlignLeft | Qt.AlignVCenter,
+                   f"刀具磨损分析报告  —  {info['刀具编号'] or '未识别刀具'}")
+        y += 80
+
+        # 汇总表
+        font.setPointSize(10)
+        font.setBold(False)
+        p.setFont(font)
+        row_h, key_w = 42, 220
+        p.setPen(QPen(QColor("#999999"), 1))
+        for name in SUMMARY_FIELDS:
+            p.drawRect(QRectF(0, y, key_w, row_h))
+            p.drawRect(QRectF(key_w, y, w - key_w, row_h))
+            p.setPen(QColor("#000000"))
+            p.drawText(QRectF(10, y, key_w - 20, row_h), Qt.AlignLeft | Qt.AlignVCenter, name)
+            p.drawText(QRectF(key_w + 10, y, w - key_w - 20, row_h),
+                       Qt.AlignLeft | Qt.AlignVCenter | Qt.TextWrapAnywhere, _fmt(name, info[name]))
+            p.setPen(QPen(QColor("#999999"), 1))
+            y += row_h
+        y += 40
+
+        img = QImage()
+        img.loadFromData(QByteArray(png), "PNG")
+        h = w * img.height() / img.width()
+        p.drawImage(QRectF(0, y, w, h), img)
+
+        p.setPen(QColor("#666666"))
+        p.drawText(QRectF(0, rect.height() - 40, w, 40), Qt.AlignRight | Qt.AlignVCenter,
+                   f"分析记录 #{info['id']}    第 {self.pages + 1} 页")
+        self.pages += 1
+
+    def close(self):
+        if self.painter is not None:
+            self.painter.end()
+
+
+def generate(ids, pdf_path: str, workers: int = None, png_dir: str = None, progress=None):
+    """
+    为 ids 中的分析结果生成多页 PDF，返回页数。
+    workers 个进程并行渲染，主进程按 ids 顺序写入；同时在途的任务不超过 2×workers 个。
+    progress(已完成, 总数) 在主进程中调用。
+    """
+    _ensure_app()
+    workers = workers or max(1, min(os.cpu_count() or 1, 8))
+    if png_dir:
+        os.makedirs(png_dir, exist_ok=True)
+    report = PdfReport(pdf_path)
+    ctx = multiprocessing.get_context("spawn")      # 不在已初始化 Qt 的进程上 fork
+    try:
+        with ctx.Pool(workers, initializer=_init_worker, initargs=(str(DB_FILE),)) as pool:
+            pending, it = deque(), iter(ids)
+            for rid in it:
+                pending.append(pool.apply_async(_render_job, (rid, png_dir)))
+                if len(pending) >= 2 * workers:
+                    break
+            while pending:
+                info, png = pending.popleft().get()
+                report.add_page(info, png)
+                if progress:
+                    progress(report.pages, len(ids))
+                rid = next(it, None)
+                if rid is not None:
+                    pending.append(pool.apply_async(_render_job, (rid, png_dir)))
+    finally:
+        report.close()
+    return report.pages
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="生成磨损分析 PDF 报告")
+    ap.add_argument("-o", "--output", required=True)
+    ap.add_argument("--tool", help="只包含该刀具编号")
+    ap.add_argument("--since", help="分析时间不早于，例如 2024-01-01")
+    ap.add_argument("--ids", type=int, nargs="*", help="指定分析记录编号")
+    ap.add_argument("--workers", type=int)
+    ap.add_argument("--png-dir", help="同时把每页图表保存为 PNG")
+    args = ap.parse_args(argv)
+
+    ids = select_results(args.tool, args.since, args.ids)
+    if not ids:
+        print("没有符合条件的已完成分析")
+        return 1
+    t0 = time.perf_counter()
+    n = generate(ids, args.output, args.workers, args.png_dir)
+    dt = time.perf_counter() - t0
+    print(f"{n} 页写入 {args.output}，{dt:.1f} s（{n / dt:.1f} 页/秒）")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# tool_events.py
+from datetime import datetime
+
+from db import get_conn, DDL_MAP
+
+# 事件类型及其中文名称
+EVENT_KINDS = {
+    "borrow":  "借用",
+    "return":  "归还",
+    "regrind": "修磨",
+    "scrap":   "报废",
+}
+
+
+def insert_event(conn, table: str, tool_id: str, kind: str, operator: str, ts: str = None):
+    """
+    在给定连接上追加一条借还事件（不提交）。当前持有表和刀具表中的借用列
+    由触发器在同一事务内同步更新。
+    """
+    if table not in DDL_MAP:
+        raise ValueError(f"未知刀具表：{table}")
+    if kind not in EVENT_KINDS:
+        raise ValueError(f"未知事件类型：{kind}")
+    if not operator:
+        raise ValueError("操作人不能为空")
+    ts = ts or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if not conn.execute(f"SELECT 1 FROM {table} WHERE 刀具编号=?", (tool_id,)).fetchone():
+        raise ValueError(f"刀具【{tool_id}】不存在")
+    held = conn.execute(
+        "SELECT 借用人 FROM tool_holdings WHERE 刀具表=? AND 刀具编号=?",
+        (table, tool_id)).fetchone()
+    if kind == "borrow" and held:
+        raise ValueError(f"刀具【{tool_id}】已被 {held[0]} 借出")
+    if kind == "return" and not held:
+        raise ValueError(f"刀具【{tool_id}】未被借出")
+    conn.execute("""
+        INSERT INTO tool_events(刀具编号, 刀具表, 事件类型, 操作人, 事件时间)
+        VALUES(?, ?, ?, ?, ?)
+    """, (tool_id, table, kind, operator, ts))
+
+
+def query_holdings(conn, operator: str = ""):
+    """当前借出的刀具（可按借用人过滤），走 tool_holdings 物化表"""
+    sql = "SELECT 借用人, 刀具表, 刀具编号, 借用时间 FROM tool_holdings"
+    args = ()
+    if operator:
+        sql += " WHERE 借用人=?"
+        args = (operator,)
+    sql += " ORDER BY 借用人, 借用时间"
+    return conn.execute(sql, args).fetchall()
+
+
+def query_history(conn, tool_id: str, limit: int = 200):
+    """某把刀具的事件历史（按时间倒序）"""
+    return conn.execute("""
+        SELECT 事件时间, 事件类型, 操作人, 刀具表
+          FROM tool_events WHERE 刀具编号=?
+         ORDER BY 事件时间 DESC, id DESC LIMIT ?
+    """, (tool_id, limit)).fetchall()
+
+
+def query_weekly_utilization(conn, weeks: int = 12):
+    """
+    按刀具类别、按周统计借用次数、借用时长（小时）和利用率。
+    借用时长 = 借用到下一次归还/报废之间的时间，尚未归还的按当前时间计；
+    整段时长计入借用发生的那一周。
+    利用率 = 借用时长 / (该类别刀具数 × 168 小时)。
+    返回 [(刀具表, 周, 借用次数, 借用小时, 利用率), ...]
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    sizes = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in DDL_MAP}
+    rows = conn.execute("""
+        WITH spans AS (
+            SELECT 刀具表, 事件类型, 事件时间,
+                   LEAD(事件时间) OVER (PARTITION BY 刀具表, 刀具编号
+                                        ORDER BY 事件时间, id) AS 结束时间
+              FROM tool_events
+             WHERE 事件类型 IN ('borrow','return','scrap')
+               AND 事件时间 >= datetime(:now, :since)
+        )
+        SELECT 刀具表, strftime('%Y-W%W', 事件时间) AS 周, COUNT(*),
+               SUM(julianday(COALESCE(结束时间, :now)) - julianday(事件时间)) * 24
+          FROM spans
+         WHERE 事件类型='borrow'
+         GROUP BY 刀具表, 周
+         ORDER BY 周 DESC, 刀具表
+    """, {"now": now, "since": f"-{int(weeks) * 7} days"}).fetchall()
+    return [
+        (table, week, n, hours, hours / (sizes[table] * 168) if sizes.get(table) else 0.0)
+        for table, week, n, hours in rows
+    ]
+
+
+def record_event(table: str, tool_id: str, kind: str, operator: str, ts: str = None):
+    """追加一条借还事件并提交"""
+    with get_conn() as conn:
+        conn.execute("BEGIN IMMEDIATE")      # 检查与写入之间不允许其他写者插入
+        insert_event(conn, table, tool_id, kind, operator, ts)
+        conn.commit()
+
+
+def holdings(operator: str = ""):
+    with get_conn() as conn:
+        return query_holdings(conn, operator)
+
+
+def history(tool_id: str, limit: int = 200):
+    with get_conn() as conn:
+        return query_history(conn, tool_id, limit)
+
+
+def weekly_utilization(weeks: int = 12):
+    with get_conn() as conn:
+        return query_weekly_utilization(conn, weeks)
@@ -0,0 +1,365 @@
+# tool_service.py
+# 多工位服务模式：由一个进程独占 Tool_system_data_base.db，
+# 通过 HTTP/JSON 为各工位提供与直连模式相同的操作（见 backend.py）。
+#
+#   TOOLS_SERVICE_TOKEN=口令 python tool_service.py serve --host 0.0.0.0 --port 8765
+#   python tool_service.py bench --clients 50
+#
+# 客户端设置环境变量 TOOLS_SERVICE_URL=http://<服务器>:8765 后启动 main.py 即可。
+
+import os
+import sys
+import hmac
+import json
+import time
+import queue
+import shutil
+import random
+import sqlite3
+import asyncio
+import argparse
+import ipaddress
+import tempfile
+import threading
+import concurrent.futures
+
+import auth
+from db      import DB_FILE, DDL_MAP, init_all_tables
+from backend import READ_OPS, WRITE_OPS, TOKEN_ENV
+from backup  import BackupScheduler
+
+REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden",
+           404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error"}
+MAX_BODY = 8 * 2 ** 20          # 请求体上限（批量开通用户时也足够）
+
+
+class _Writer(threading.Thread):
+    """
+    唯一的写线程。把队列中已积压的写请求合并为一个事务提交（组提交），
+    每个请求包在 SAVEPOINT 中，单个请求失败不影响同批其他请求。
+    """
+
+    def __init__(self, db_file, max_batch: int = 64):
+        super().__init__(name="db-writer", daemon=True)
+        self.db_file = db_file
+        self.max_batch = max_batch
+        self.jobs = queue.Queue()
+        self.version = 0          # 每提交一批加 1，供客户端判断数据是否变化
+
+    def submit(self, fn, kwargs) -> concurrent.futures.Future:
+        fut = concurrent.futures.Future()
+        self.jobs.put((fn, kwargs, fut))
+        return fut
+
+    def stop(self):
+        self.jobs.put(None)
+
+    def run(self):
+        conn = sqlite3.connect(self.db_file, isolation_level=None)
+        stopping = False
+        while not stopping:
+            job = self.jobs.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < self.max_batch:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+
+            done = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for fn, kwargs, fut in batch:
+                    conn.execute("SAVEPOINT job")
+                    try:
+                        result = fn(conn, **kwargs)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO job")
+                        done.append((fut, None, e))
+                    else:
+                        done.append((fut, result, None))
+                    conn.execute("RELEASE job")
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                # 整批提交失败（如磁盘已满、数据库被锁），本批请求全部报错
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                done = [(fut, None, e) for _, _, fut in batch]
+            self.version += 1
+            for fut, result, err in done:
+                if err is None:
+                    fut.set_result(result)
+                else:
+                    fut.set_exception(err)
+        conn.close()
+
+
+class ToolService:
+    """异步 HTTP/JSON 服务：一个写线程 + 读连接池"""
+
+    def __init__(self, db_file=DB_FILE, readers: int = 4, token: str = "", wal: bool = False):
+        self.db_file = str(db_file)
+        self.token = token
+        self.wal = wal
+        self._local = threading.local()
+        self.readers = concurrent.futures.ThreadPoolExecutor(
+            max_workers=readers, thread_name_prefix="db-reader")
+        self.writer = _Writer(self.db_file)
+        # 口令 KDF 单独使用线程池，避免登录占满读连接
+        self.kdf_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="kdf")
+        self.server = None
+        self.auth_ops = {
+            "verify_user":  self._verify_user,
+            "upsert_user":  self._upsert_user,
+            "upsert_users": self._upsert_users,
+        }
+
+    # —— 数据库访问 —— #
+    def _read(self, fn, kwargs):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True)
+            self._local.conn = conn
+        return fn(conn, **kwargs)
+
+    async def _read_op(self, fn, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.readers, self._read, fn, kwargs)
+
+    async def _write_op(self, fn, **kwargs):
+        return await asyncio.wrap_future(self.writer.submit(fn, kwargs))
+
+    # —— 口令相关：KDF 在 kdf_pool 中计算，写线程只做最终写入 —— #
+    async def _verify_user(self, uid, pwd):
+        loop = asyncio.get_running_loop()
+        stored = await self._read_op(auth.get_password_hash, uid=uid)
+        ok, upgrade = await loop.run_in_executor(self.kdf_pool, auth.check_password, pwd, stored)
+        if ok and upgrade:
+            new = await loop.run_in_executor(self.kdf_pool, auth.hash_password, pwd)
+            await self._write_op(auth.apply_upgrade, uid=uid, old=stored, new=new)
+        return ok
+
+    async def _upsert_users(self, users):
+        loop = asyncio.get_running_loop()
+        hashed = await loop.run_in_executor(self.kdf_pool, auth.hash_users, users)
+        await self._write_op(auth.store_hashes, users=hashed)
+        return len(hashed)
+
+    async def _upsert_user(self, uid, pwd):
+        await self._upsert_users([(uid, pwd)])
+
+    async def _dispatch(self, method, path, body, headers):
+        if self.token and not hmac.compare_digest(
+                headers.get("x-token", "").encode(), self.token.encode()):
+            return 403, {"ok": False, "error": "无效的访问令牌"}
+        if method == "GET" and path == "/version":
+            return 200, {"ok": True, "result": self.writer.version}
+        if method != "POST" or not path.startswith("/rpc/"):
+            return 404, {"ok": False, "error": f"未知路径：{path}"}
+        op = path[len("/rpc/"):]
+        try:
+            kwargs = json.loads(body or b"{}")
+            if op in self.auth_ops:
+                result = await self.auth_ops[op](**kwargs)
+            elif op in READ_OPS:
+                result = await self._read_op(READ_OPS[op], **kwargs)
+            elif op in WRITE_OPS:
+                result = await self._write_op(WRITE_OPS[op], **kwargs)
+            else:
+                return 404, {"ok": False, "error": f"未知操作：{op}"}
+        except (ValueError, TypeError, sqlite3.IntegrityError) as e:
+            return 400, {"ok": False, "error": str(e)}
+        except Exception as e:
+            return 500, {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return 200, {"ok": True, "result": result}
+
+    # —— HTTP/1.1（支持长连接） —— #
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path, _ = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                length = headers.get("content-length") or "0"
+                if not length.isdigit():
+                    # 请求体长度无法确定，回复后断开连接
+                    await self._reply(writer, 400, {"ok": False, "error": "无效的 Content-Length"})
+                    break
+                if int(length) > MAX_BODY:
+                    await self._reply(writer, 413, {"ok": False, "error": f"请求体超过 {MAX_BODY} 字节"})
+                    break
+                body = await reader.readexactly(int(length))
+
+                status, payload = await self._dispatch(method, path, body, headers)
+                await self._reply(writer, status, payload)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _reply(writer, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+        await writer.drain()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        if not self.token and not _is_loopback(host):
+            # 无令牌时任何人都能调用 upsert_user 重置口令，只允许本机访问
+            raise ValueError(f"监听 {host} 时必须设置访问令牌（环境变量 {TOKEN_ENV}）")
+        init_all_tables(self.db_file)
+        with sqlite3.connect(self.db_file) as conn:
+            if self.wal:
+                # WAL 让读连接不阻塞写线程，但需要共享内存：只能用于服务器本地磁盘上的数据库，
+                # 且切换后直连模式的工位不能再通过网络共享打开同一文件
+                conn.execute("PRAGMA journal_mode=WAL")
+            auth.ensure_kdf_params(conn)
+        self.writer.start()
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server
+
+    async def serve_forever(self, host="127.0.0.1", port=8765):
+        await self.start(host, port)
+        addr = ", ".join(str(s.getsockname()) for s in self.server.sockets)
+        print(f"刀具数据库服务已启动：{addr}")
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        if self.server:
+            self.server.close()
+        self.writer.stop()
+        self.readers.shutdown(wait=False)
+        self.kdf_pool.shutdown(wait=False)
+
+
+def _is_loopback(host) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+# —— 压测：N 个模拟工位并发请求 —— #
+async def _bench_client(host, port, n_requests, write_ratio, rowids, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    tables = list(DDL_MAP)
+    try:
+        for _ in range(n_requests):
+            table = random.choice(tables)
+            if random.random() < write_ratio:
+                op, args = "update_tool", {"table": table, "rowid": random.choice(rowids[table]),
+                                           "column": "使用次数", "value": random.randint(0, 99)}
+            elif random.random() < 0.5:
+                op, args = "condition_counts", {"table": table}
+            else:
+                op, args = "list_tools", {"table": table, "text": ""}
+            body = json.dumps(args, ensure_ascii=False).encode()
+            t0 = time.perf_counter()
+            writer.write(
+                f"POST /rpc/{op} HTTP/1.1\r\nHost: {host}\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+            length = 0
+            while True:
+                h = await reader.readline()
+                if h in (b"\r\n", b""):
+                    break
+                if h.lower().startswith(b"content-length:"):
+                    length = int(h.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - t0)
+    finally:
+        writer.close()
+
+
+async def _bench(args):
+    tmp = tempfile.mkdtemp()
+    db_copy = os.path.join(tmp, "bench.db")
+    shutil.copy(DB_FILE, db_copy)
+    service = ToolService(db_copy, readers=args.readers, wal=args.wal)
+    server = await service.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    with sqlite3.connect(db_copy) as conn:
+        rowids = {t: [r[0] for r in conn.execute(f"SELECT rowid FROM {t}")] for t in DDL_MAP}
+
+    latencies = []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(
+        _bench_client("127.0.0.1", port, args.requests, args.write_ratio, rowids, latencies)
+        for _ in range(args.clients)))
+    elapsed = time.perf_counter() - t0
+    service.close()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"客户端 {args.clients} × 请求 {args.requests}（写比例 {args.write_ratio:.0%}，"
+          f"读连接 {args.readers}）")
+    print(f"吞吐量 {total / elapsed:.0f} 请求/秒，"
+          f"p50 {latencies[total // 2] * 1e3:.2f} ms，"
+          f"p99 {latencies[int(total * 0.99)] * 1e3:.2f} ms")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="刀具数据库多工位服务")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("serve", help="启动服务")
+    sp.add_argument("--host", default="127.0.0.1")
+    sp.add_argument("--port", type=int, default=8765)
+    sp.add_argument("--readers", type=int, default=4)
+    sp.add_argument("--wal", action="store_true",
+                    help="开启 WAL（仅当数据库在本机磁盘上、且没有工位经网络共享直连时使用）")
+    bp = sub.add_parser("bench", help="用 N 个模拟客户端压测（在数据库临时副本上进行）")
+    bp.add_argument("--clients", type=int, default=20)
+    bp.add_argument("--requests", type=int, default=200)
+    bp.add_argument("--write-ratio", type=float, default=0.1)
+    bp.add_argument("--readers", type=int, default=4)
+    bp.add_argument("--wal", action="store_true", help="临时副本使用 WAL")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        service = ToolService(readers=args.readers, token=os.environ.get(TOKEN_ENV, ""),
+                              wal=args.wal)
+        if not service.token and not _is_loopback(args.host):
+            print(f"监听 {args.host} 时必须设置访问令牌：先设置环境变量 {TOKEN_ENV}")
+            return 1
+        # 服务端独占数据库，定时备份也在服务端进行（见 backup.py）
+        init_all_tables()
+        backups = BackupScheduler(
+            on_done=lambda path, err: print(f"已备份到 {path}" if path else f"备份失败：{err}"))
+        backups.start()
+        try:
+            asyncio.run(service.serve_forever(args.host, args.port))
+        except KeyboardInterrupt:
+            service.close()
+        finally:
+            backups.stop()
+    else:
+        asyncio.run(_bench(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+# watch_folder.py
+# 监控文件夹自动分析：采集工位每次走刀后向共享文件夹写入一个 CSV，
+# 这里发现新文件 → 等待写入完成 → 排队做磨损预测 → 结果写入 analysis_results 表。
+#
+#   python watch_folder.py /data/mill_drops --workers 2     # 无界面运行
+#
+# Linux 上使用 inotify 即时发现文件，其他平台（或 inotify 不可用时）退化为定时扫描。
+# 已处理的文件按 (路径, 大小, 修改时间) 记录在数据库中，重启后不会重复处理。
+
+import os
+import sys
+import json
+import time
+import ctypes
+import select
+import struct
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from db         import get_conn, DDL_MAP, init_all_tables
+from predictor  import build_features
+from ensemble   import load_ensemble
+from csv_loader import load_sensor_csv
+import wear_history
+
+SETTLE_SECONDS = 2.0        # 大小和修改时间保持不变多久才认为写入完成
+SCAN_INTERVAL  = 5.0        # 定时全量扫描间隔（inotify 模式下作为兜底）
+TICK           = 0.5        # 主循环节拍
+RUNS_PER_FILE  = 1_000_000  # 写入磨损历史时每个文件占用的运行序号区间，按 analysis_results.id 错开
+
+# —— inotify（ctypes 调用 libc，不依赖第三方库） —— #
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO    = 0x00000080
+IN_NONBLOCK    = 0o4000
+IN_CLOEXEC     = 0o2000000
+_EVENT_HEADER  = struct.Struct("iIII")
+
+
+class _Inotify:
+    def __init__(self, path):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(path), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"无法监控 {path}")
+
+    def read(self, timeout: float):
+        """等待最多 timeout 秒，返回期间写完或移入的文件名列表"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        names, i = [], 0
+        while i < len(data):
+            _, _, _, n = _EVENT_HEADER.unpack_from(data, i)
+            i += _EVENT_HEADER.size
+            names.append(os.fsdecode(data[i:i + n].rstrip(b"\0")))
+            i += n
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _open_inotify(path):
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return _Inotify(path)
+    except (OSError, AttributeError):
+        return None
+
+
+# —— 分析 —— #
+def _tool_id_from_name(conn, name: str):
+    """文件名约定为 <刀具编号>_xxx.csv；编号在刀具表中存在时才记录"""
+    prefix = os.path.basename(name).split("_", 1)[0]
+    for table in DDL_MAP:
+        if conn.execute(f"SELECT 1 FROM {table} WHERE 刀具编号=?", (prefix,)).fetchone():
+            return prefix
+    return None
+
+
+def analyse_csv(path: str):
+    """对一个 CSV 做磨损预测，返回集成均值列表（未通过数据检查的行不参与预测）"""
+    df, _ = load_sensor_csv(path)
+    return load_ensemble().predict(build_features(df).to_numpy(dtype="float32"))[0].tolist()
+
+
+class FolderWatcher:
+    """
+    监控目录中的 *.csv。新文件先进入待定表，大小和修改时间稳定 SETTLE_SECONDS 秒后
+    在数据库中登记（INSERT OR IGNORE，已登记的跳过），再交给至多 workers 个线程预测。
+    on_result(dict) 在工作线程中调用。
+    """
+
+    def __init__(self, folder: str, workers: int = 2, on_result=None):
+        self.folder = os.path.abspath(folder)
+        self.workers = workers
+        self.on_result = on_result
+        self.pending = {}             # 路径 -> (大小, 修改时间, 首次稳定的时刻)
+        self.seen = set()             # 已登记的 (路径, 大小, 修改时间)，定时扫描时直接跳过
+        self.ready = deque()          # 等待预测的 (id, 路径)
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.mode = ""
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+
+    # —— 生命周期 —— #
+    def start(self):
+        prefix = os.path.join(self.folder, "")
+        with get_conn() as conn:
+            # 本文件夹中上次退出时尚未完成的文件重新排队（其他文件夹的由各自的监控处理）
+            self.ready.extend(row for row in conn.execute(
+                "SELECT id, 文件路径 FROM analysis_results WHERE 状态='queued' ORDER BY id")
+                if row[1].startswith(prefix))
+            self.seen.update(row for row in conn.execute(
+                "SELECT 文件路径, 文件大小, 修改时间 FROM analysis_results") if row[0].startswith(prefix))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="wear-analysis")
+        self._thread = threading.Thread(target=self._loop, name="folder-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监控；不等待正在预测的文件，排队中的取消（状态仍为 queued，下次启动时继续）"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # —— 发现与去抖 —— #
+    def _candidate(self, path):
+        name = os.path.basename(path)
+        if not name.lower().endswith(".csv") or name.startswith("."):
+            return
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.pending.pop(path, None)
+            return
+        sig = (st.st_size, st.st_mtime_ns)
+        if (path, *sig) in self.seen:
+            self.pending.pop(path, None)
+            return
+        old = self.pending.get(path)
+        if old is None or old[:2] != sig:
+            self.pending[path] = (*sig, time.monotonic())
+
+    def _scan(self):
+        try:
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    if entry.is_file():
+                        self._candidate(entry.path)
+        except FileNotFoundError:
+            pass
+
+    def _promote(self):
+        """把已稳定的文件登记到数据库；同一 (路径, 大小, 修改时间) 只会登记一次"""
+        now, stable = time.monotonic(), []
+        for path in list(self.pending):
+            self._candidate(path)        # 重新 stat，大小或时间变化会重置计时
+            entry = self.pending.get(path)
+            if entry is not None and now - entry[2] >= SETTLE_SECONDS:
+                del self.pending[path]
+                stable.append((path, entry[0], entry[1]))
+        if not stable:
+            return
+        # 一批稳定文件在同一事务中登记，突发上百个文件时也只提交一次
+        with get_conn() as conn:
+            for path, size, mtime in stable:
+                cur = conn.execute("""
+                    INSERT OR IGNORE INTO analysis_results(文件路径, 文件大小, 修改时间, 刀具编号)
+                    VALUES(?, ?, ?, ?)
+                """, (path, size, mtime, _tool_id_from_name(conn, path)))
+                if cur.rowcount:
+                    self.ready.append((cur.lastrowid, path))
+                self.seen.add((path, size, mtime))
+            conn.commit()
+
+    def _dispatch(self):
+        with self.lock:
+            while self.ready and self.in_flight < self.workers:
+                self.in_flight += 1
+                self._pool.submit(self._process, *self.ready.popleft())
+
+    def _loop(self):
+        ino = _open_inotify(self.folder)
+        self.mode = "inotify" if ino else "polling"
+        last_scan = 0.0
+        try:
+            while not self._stop.is_set():
+                if time.monotonic() - last_scan >= SCAN_INTERVAL:
+                    self._scan()
+                    last_scan = time.monotonic()
+                if ino:
+                    for name in ino.read(TICK):
+                        self._candidate(os.path.join(self.folder, name))
+                else:
+                    self._stop.wait(TICK)
+                self._promote()
+                self._dispatch()
+        finally:
+            if ino:
+                ino.close()
+
+    # —— 预测（工作线程） —— #
+    def _process(self, rid, path):
+        result = {"id": rid, "文件路径": path}
+        try:
+            y = analyse_csv(path)
+            result.update(状态="done", 样本数=len(y), 最大VB=max(y), 平均VB=sum(y) / len(y),
+                          最终VB=y[-1], 预测值=y, 错误=None)
+        except Exception as e:
+            result.update(状态="failed", 样本数=None, 最大VB=None, 平均VB=None,
+                          最终VB=None, 预测值=None, 错误=f"{type(e).__name__}: {e}")
+        result["分析时间"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        updated = False
+        try:
+            with get_conn() as conn:
+                # 停止后立即重新启动时，同一行可能被新旧两个线程池各处理一次，只接受先完成的
+                cur = conn.execute("""
+                    UPDATE analysis_results
+                       SET 状态=?, 分析时间=?, 样本数=?, 最大VB=?, 平均VB=?, 最终VB=?, 预测值=?, 错误=?
+                     WHERE id=? AND 状态='queued'
+                """, (result["状态"], result["分析时间"], result["样本数"], result["最大VB"],
+                      result["平均VB"], result["最终VB"],
+                      json.dumps(result["预测值"]) if result["预测值"] is not None else None,
+                      result["错误"], rid))
+                updated = cur.rowcount > 0
+                # 能识别刀具编号时同时写入磨损历史，时间取文件修改时间（采集时间）；
+                # 同一刀具、同一秒内的多个文件按 id 使用不同的运行序号，互不覆盖
+                tool, mtime_ns = conn.execute(
+                    "SELECT 刀具编号, 修改时间 FROM analysis_results WHERE id=?", (rid,)).fetchone()
+                if updated and tool and result["状态"] == "done":
+                    wear_history.insert_points(conn, tool, y, ts=mtime_ns // 10 ** 9,
+                                               first_run=rid * RUNS_PER_FILE)
+                conn.commit()
+        except Exception as e:
+            # 例如 database is locked：该行仍为 queued，下次启动时重新分析；通过 on_result 报告
+            updated = True
+            result.update(状态="failed", 错误=f"结果写入数据库失败（下次启动时重试）：{type(e).__name__}: {e}")
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        # 该行已被另一个线程池处理过时不重复报告
+        if updated and self.on_result:
+            self.on_result(result)
+
+
+def recent_results(limit: int = 200):
+    """最近的分析结果（不含预测值明细）"""
+    with get_conn() as conn:
+        return conn.execute("""
+            SELECT id, 分析时间, 文件路径, 刀具编号, 状态, 样本数, 最大VB, 最终VB, 错误
+              FROM analysis_results ORDER BY id DESC LIMIT ?
+        """, (limit,)).fetchall()
+
+
+def load_predictions(rid: int):
+    """读取某条分析结果的预测值列表（失败或未完成时返回空列表）"""
+    with get_conn() as conn:
+        row = conn.execute("SELECT 预测值 FROM analysis_results WHERE id=?", (rid,)).fetchone()
+    return json.loads(row[0]) if row and row[0] else []
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="监控文件夹中新写入的 CSV 并自动做磨损预测")
+    ap.add_argument("folder")
+    ap.add_argument("--workers", type=int, default=2, help="同时进行的预测数")
+    args = ap.parse_args(argv)
+
+    init_all_tables()
+
+    def report(r):
+        if r["状态"] == "done":
+            print(f"[完成] {r['文件路径']}  样本 {r['样本数']}  最大 VB {r['最大VB']:.3f}")
+        else:
+            print(f"[失败] {r['文件路径']}  {r['错误']}")
+
+    watcher = FolderWatcher(args.folder, args.workers, report)
+    watcher.start()
+    print(f"正在监控 {watcher.folder}（Ctrl+C 退出）")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+# wear_history.py
+# 磨损历史：每次预测的逐次 VB 按 (刀具编号, 时间, 运行) 保存在 WITHOUT ROWID 表中，
+# 同时维护按小时/按天预聚合的 wear_rollup，趋势查询只读聚合行。
+#
+#   python wear_history.py trend --tool DR880-20-5D --days 90
+#   python wear_history.py trend --table drill_tools --supplier Sandvik --days 90
+#   python wear_history.py compact --keep-days 365      # 删除早于保留期的原始点（聚合保留）
+#   python wear_history.py tz --utc-offset 8            # 修改“天”的划分时区并按原始点重建聚合
+#   python wear_history.py bench --points 20000000      # 在临时库上测试写入和查询耗时
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+from db import DDL_MAP, get_conn, init_all_tables, get_setting, set_setting
+
+LEVELS = {"hour": 3600, "day": 86400}
+RAW_KEEP_DAYS = 365          # 原始点保留天数
+HOUR_KEEP_DAYS = 400         # 小时聚合保留天数；天聚合一直保留
+
+
+INSERT_CHUNK = 200           # 每条多行 INSERT 的点数（4 个参数/点，低于旧版 SQLite 的 999 个参数上限）
+
+
+def _bucket(ts: int, width: int, tz_offset: int = 0) -> int:
+    """ts 所在时段的起点；tz_offset 为本地时间相对 UTC 的秒数，使“天”从本地零点开始"""
+    return ts - (ts + tz_offset) % width
+
+
+def _tz_offset(conn) -> int:
+    """划分时段用的 UTC 偏移（秒），init_all_tables 首次建库时记为本机时区；固定值，不随夏令时变化"""
+    return int(get_setting(conn, "wear_tz_offset", 0))
+
+
+def _compacted(conn) -> dict:
+    """compact() 的截止时刻 {"raw": 原始点, "hour": 小时聚合}；早于截止的时段数据已不完整"""
+    raw = get_setting(conn, "wear_compacted")
+    return json.loads(raw) if raw else {"raw": 0, "hour": 0}
+
+
+def _add_rollup(conn, width: int, tool_id: str, start: int, added):
+    """把新写入的点累加到一个聚合时段"""
+    conn.execute("""
+        INSERT INTO wear_rollup(级别, 刀具编号, 时段, 点数, 最大VB, 最小VB, 合计VB)
+        VALUES(?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(级别, 刀具编号, 时段) DO UPDATE SET
+            点数=点数+excluded.点数, 最大VB=MAX(最大VB, excluded.最大VB),
+            最小VB=MIN(最小VB, excluded.最小VB), 合计VB=合计VB+excluded.合计VB
+    """, (width, tool_id, start, len(added), max(added), min(added), sum(added)))
+
+
+def insert_points(conn, tool_id: str, values, ts: int = None, first_run: int = 0):
+    """
+    在给定连接上追加一次预测的逐次 VB（不提交），并把实际写入的点累加到小时/天聚合。
+    同一 (刀具编号, 时间, 运行) 重复写入时忽略。返回写入的点数。
+    原始点已被 compact() 删除的日期不再接受写入（无法判断是否重复，聚合会被重复累加），返回 0。
+    """
+    if not tool_id:
+        raise ValueError("刀具编号不能为空")
+    ts = int(ts if ts is not None else time.time())
+    off = _tz_offset(conn)
+    marks = _compacted(conn)
+    if _bucket(ts, LEVELS["day"], off) < marks["raw"]:
+        return 0
+    rows = [(tool_id, ts, first_run + i, float(v)) for i, v in enumerate(values)]
+    # RETURNING 只返回真正插入的行，重复的点不会计入聚合
+    added = []
+    for i in range(0, len(rows), INSERT_CHUNK):
+        part = rows[i:i + INSERT_CHUNK]
+        added += [r[0] for r in conn.execute(
+            "INSERT OR IGNORE INTO wear_history(刀具编号, 时间, 运行, VB) VALUES "
+            + ", ".join(["(?, ?, ?, ?)"] * len(part)) + " RETURNING VB",
+            [x for r in part for x in r])]
+    if added:
+        for level, width in LEVELS.items():
+            start = _bucket(ts, width, off)
+            if level == "hour" and start < marks["hour"]:
+                continue                  # 已删除的小时聚合不再重建
+            _add_rollup(conn, width, tool_id, start, added)
+    return len(added)
+
+
+def set_tz_offset(conn, tz_offset: int):
+    """
+    设置划分时段用的 UTC 偏移（秒）并按原始点重建聚合（不提交）。
+    原始点已压缩的时段保留原聚合行。
+    """
+    set_setting(conn, "wear_tz_offset", str(int(tz_offset)))
+    since = _compacted(conn)["raw"]
+    conn.execute("DELETE FROM wear_rollup WHERE 时段>=?", (since,))
+    for width in LEVELS.values():
+        conn.execute("""
+            INSERT INTO wear_rollup(级别, 刀具编号, 时段, 点数, 最大VB, 最小VB, 合计VB)
+            SELECT ?, 刀具编号, 时间 - (时间 + ?) % ?, COUNT(*), MAX(VB), MIN(VB), SUM(VB)
+              FROM wear_history
+             WHERE 时间>=?
+             GROUP BY 刀具编号, 3
+            ON CONFLICT(级别, 刀具编号, 时段) DO UPDATE SET
+                点数=点数+excluded.点数, 最大VB=MAX(最大VB, excluded.最大VB),
+                最小VB=MIN(最小VB, excluded.最小VB), 合计VB=合计VB+excluded.合计VB
+        """, (width, int(tz_offset), width, since))
+
+
+def pick_level(days: float) -> str:
+    """两周以内按小时，否则按天（90 天约 90 个点）"""
+    return "hour" if days <= 14 else "day"
+
+
+def query_trend(conn, tool_id: str = None, table: str = None, supplier: str = None,
+                days: float = 90, level: str = None, now: int = None):
+    """
+    磨损趋势：单把刀具（tool_id），或某类刀具中某生产商的全部刀具（table + supplier）。
+    返回 {"level": 级别, "rows": [[时段起点, 点数, 最大VB, 平均VB, 最小VB], ...]}，
+    只读取预聚合行。
+    """
+    level = level or pick_level(days)
+    if level not in LEVELS:
+        raise ValueError(f"未知聚合级别：{level}")
+    width = LEVELS[level]
+    since = int((now or time.time()) - days * 86400)
+    off = _tz_offset(conn)
+    if tool_id:
+        where, args = "刀具编号=?", [tool_id]
+    elif table and supplier:
+        if table not in DDL_MAP:
+            raise ValueError(f"未知刀具表：{table}")
+        where, args = f"刀具编号 IN (SELECT 刀具编号 FROM {table} WHERE 生产商=?)", [supplier]
+    else:
+        raise ValueError("请指定刀具编号，或刀具类别和生产商")
+    rows = conn.execute(f"""
+        SELECT 时段, SUM(点数), MAX(最大VB), SUM(合计VB) / SUM(点数), MIN(最小VB)
+          FROM wear_rollup
+         WHERE 级别=? AND {where} AND 时段>=?
+         GROUP BY 时段 ORDER BY 时段
+    """, [width, *args, _bucket(since, width, off)]).fetchall()
+    return {"level": level, "rows": [list(r) for r in rows]}
+
+
+def suppliers(conn, table: str):
+    """某类刀具的生产商列表"""
+    if table not in DDL_MAP:
+        raise ValueError(f"未知刀具表：{table}")
+    return [r[0] for r in conn.execute(
+        f"SELECT DISTINCT 生产商 FROM {table} WHERE 生产商 IS NOT NULL ORDER BY 生产商")]
+
+
+def compact(conn, keep_days: float = RAW_KEEP_DAYS, hour_keep_days: float = HOUR_KEEP_DAYS,
+            now: int = None):
+    """
+    压缩：删除早于保留期的原始点和小时聚合（天聚合保留，长期趋势不受影响），
+    返回 (删除的原始点数, 删除的小时聚合行数)。不提交。
+    截止时刻记入 app_settings，之后不再接受更早日期的点。
+    """
+    now = int(now or time.time())
+    off = _tz_offset(conn)
+    raw_cut = _bucket(now - int(keep_days * 86400), LEVELS["day"], off)
+    hour_cut = _bucket(now - int(hour_keep_days * 86400), LEVELS["hour"], off)
+    raw = conn.execute("DELETE FROM wear_history WHERE 时间<?", (raw_cut,)).rowcount
+    hourly = conn.execute("DELETE FROM wear_rollup WHERE 级别=? AND 时段<?",
+                          (LEVELS["hour"], hour_cut)).rowcount
+    marks = _compacted(conn)
+    set_setting(conn, "wear_compacted", json.dumps(
+        {"raw": max(marks["raw"], raw_cut), "hour": max(marks["hour"], hour_cut)}))
+    return raw, hourly
+
+
+# —— 性能测试 —— #
+def _bench(args):
+    tmp = tempfile.mkdtemp(prefix="wear-bench-")
+    path = os.path.join(tmp, "wear.db")
+    init_all_tables(path)
+    conn = sqlite3.connect(path)
+    n_tools = args.tools
+    tools = [f"BENCH-{i:05d}" for i in range(n_tools)]
+    conn.executemany("INSERT INTO drill_tools(刀具编号, 刀具型号, 生产商) VALUES(?, 'X', ?)",
+                     ((t, f"S{i % 20}") for i, t in enumerate(tools)))
+    # 每次分析约 300 个点，时间均匀分布在最近 days 天内
+    per_run = 300
+    n_runs = args.points // per_run
+    now = int(time.time())
+    rnd = random.Random(1)
+    t0 = time.perf_counter()
+    for k in range(n_runs):
+        ts = now - int(args.days * 86400 * (1 - k / n_runs))
+        base = rnd.random() * 0.2
+        insert_points(conn, tools[k % n_tools], (base + j * 0.002 for j in range(per_run)), ts)
+        if k % 2000 == 1999:
+            conn.commit()
+    conn.commit()
+    dt = time.perf_counter() - t0
+    print(f"写入 {n_runs * per_run} 点（{n_tools} 把刀具，{args.days} 天），"
+          f"{dt:.1f} s，{n_runs * per_run / dt / 1e6:.2f} M 点/秒，库 {os.path.getsize(path) / 2 ** 20:.0f} MB")
+
+    def timed(label, fn, repeat=20):
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            res = fn()
+        print(f"{label:<30} {(time.perf_counter() - t0) / repeat * 1000:7.2f} ms，{len(res['rows'])} 个时段")
+
+    timed("单把刀具 90 天（按天）", lambda: query_trend(conn, tool_id=tools[7], days=90, now=now))
+    timed("单把刀具 7 天（按小时）", lambda: query_trend(conn, tool_id=tools[7], days=7, now=now))
+    timed("某生产商全部钻头 90 天（按天）",
+          lambda: query_trend(conn, table="drill_tools", supplier="S3", days=90, now=now))
+    t0 = time.perf_counter()
+    raw = conn.execute("""
+        SELECT 时间 - 时间 % 86400, MAX(VB), AVG(VB) FROM wear_history
+         WHERE 刀具编号 IN (SELECT 刀具编号 FROM drill_tools WHERE 生产商='S3') AND 时间>=?
+         GROUP BY 1
+    """, (now - 90 * 86400,)).fetchall()
+    print(f"{'对照：直接聚合原始点':<30} {(time.perf_counter() - t0) * 1000:7.2f} ms，{len(raw)} 个时段")
+    conn.close()
+    for name in os.listdir(tmp):
+        os.remove(os.path.join(tmp, name))
+    os.rmdir(tmp)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="刀具磨损历史")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    tp = sub.add_parser("trend", help="查询磨损趋势")
+    tp.add_argument("--tool")
+    tp.add_argument("--table", choices=list(DDL_MAP))
+    tp.add_argument("--supplier")
+    tp.add_argument("--days", type=float, default=90)
+    tp.add_argument("--level", choices=list(LEVELS))
+    cp = sub.add_parser("compact", help="删除早于保留期的原始点")
+    cp.add_argument("--keep-days", type=float, default=RAW_KEEP_DAYS)
+    zp = sub.add_parser("tz", help="修改“天”的划分时区（重建聚合）")
+    zp.add_argument("--utc-offset", type=float, required=True, help="相对 UTC 的小时数，如 8")
+    bp = sub.add_parser("bench", help="在临时库上测试写入和趋势查询")
+    bp.add_argument("--points", type=int, default=20_000_000)
+    bp.add_argument("--tools", type=int, default=200)
+    bp.add_argument("--days", type=int, default=365)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "bench":
+        _bench(args)
+        return
+    init_all_tables()
+    with get_conn() as conn:
+        if args.cmd == "trend":
+            res = query_trend(conn, args.tool, args.table, args.supplier, args.days, args.level)
+            for start, n, vb_max, vb_mean, vb_min in res["rows"]:
+                print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(start))}  {n:6d} 点  "
+                      f"最大 {vb_max:.3f}  平均 {vb_mean:.3f}  最小 {vb_min:.3f}")
+        elif args.cmd == "tz":
+            set_tz_offset(conn, round(args.utc_offset * 3600))
+            conn.commit()
+            print(f"已按 UTC{args.utc_offset:+g} 重建磨损聚合")
+        else:
+            raw, hourly = compact(conn, args.keep_days)
+            conn.commit()
+            print(f"删除 {raw} 个原始点、{hourly} 行小时聚合")
+
+
+if __name__ == "__main__":
+    sys.exit(main())